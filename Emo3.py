@@ -4,6 +4,7 @@ from datasets import Dataset, DatasetDict
 import pandas as pd
 import numpy as np
 import os
+import json
 from huggingface_hub import login
 
 # 登录 HuggingFace
@@ -26,20 +27,36 @@ for item in emotion_data:
     item["label"] = label_dict[item["label"]]
 
 # 3. 创建数据集
-np.random.seed(42)
-random_indices = np.random.permutation(len(emotion_data))
-train_size = int(0.8 * len(emotion_data))
-
-train_data = [emotion_data[i] for i in random_indices[:train_size]]
-val_data = [emotion_data[i] for i in random_indices[train_size:]]
-
-train_dataset = Dataset.from_list(train_data)
-val_dataset = Dataset.from_list(val_data)
-
-dataset = DatasetDict({
-    'train': train_dataset,
-    'validation': val_dataset
-})
+# 与 Emo4.py 相同：config.json 中设置 data_files（CSV/JSONL/Parquet 文件或文件列表）时从外部文件流式读取，
+# 否则使用上面的内置数据
+try:
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+except FileNotFoundError:
+    config = {}
+data_files = config.get("data_files")
+streaming = bool(data_files)
+if streaming:
+    from itertools import islice
+    from emotion_ingest import load_streaming_corpus
+    dataset = load_streaming_corpus(data_files, val_ratio=config.get("val_ratio", 0.2), seed=42)
+    # 验证集是对整个语料的哈希过滤，只取前 eval_samples 条，避免每次评估重读全部语料
+    val_data = list(islice(dataset["validation"], config.get("eval_samples", 2000)))
+else:
+    np.random.seed(42)
+    random_indices = np.random.permutation(len(emotion_data))
+    train_size = int(0.8 * len(emotion_data))
+
+    train_data = [emotion_data[i] for i in random_indices[:train_size]]
+    val_data = [emotion_data[i] for i in random_indices[train_size:]]
+
+    train_dataset = Dataset.from_list(train_data)
+    val_dataset = Dataset.from_list(val_data)
+
+    dataset = DatasetDict({
+        'train': train_dataset,
+        'validation': val_dataset
+    })
 
 # 4. 模型和分词器
 # 使用较小的中文模型
@@ -73,16 +90,27 @@ def tokenize_function(examples):
     tokenized["labels"] = examples["label"]
     return tokenized
 
-# 修改数据集映射方式
-tokenized_dataset = dataset.map(
-    tokenize_function,
-    batched=True,
-    remove_columns=dataset["train"].column_names,
-    load_from_cache_file=False
-)
+if streaming:
+    # 流式数据集在迭代时才分词
+    tokenized_dataset = dataset.map(tokenize_function, batched=True, remove_columns=["text", "label"])
+    tokenized_dataset["validation"] = Dataset.from_list(val_data).map(
+        tokenize_function, batched=True, remove_columns=["text", "label"]
+    )
+else:
+    # 修改数据集映射方式
+    from emotion_token_cache import cached_tokenize
+    tokenized_dataset = cached_tokenize(
+        dataset,
+        tokenize_function,
+        tokenizer,
+        128,
+        settings={"padding": "max_length"},
+        batched=True,
+        remove_columns=dataset["train"].column_names
+    )
 
-# 确保数据集格式正确
-tokenized_dataset.set_format("torch")
+    # 确保数据集格式正确
+    tokenized_dataset.set_format("torch")
 
 # 6. 训练参数
 training_args = TrainingArguments(
@@ -99,6 +127,7 @@ training_args = TrainingArguments(
     load_best_model_at_end=True,
     learning_rate=2e-5,
     remove_unused_columns=True,
+    max_steps=config.get("max_steps", -1),  # 流式数据集长度未知，必须设置 max_steps
 )
 
 # 7. 训练器
@@ -135,25 +135,53 @@ emotion_data = [
 ]
 
 # 2. 将标签转换为数字
-label_dict = {"快乐": 0, "愤怒": 1, "悲伤": 2}
+from emotion_labels import label_dict
 for item in emotion_data:
     item["label"] = label_dict[item["label"]]
 
-# 3. 创建数据集
-np.random.seed(42)
-random_indices = np.random.permutation(len(emotion_data))
-train_size = int(0.8 * len(emotion_data))
-
-train_data = [emotion_data[i] for i in random_indices[:train_size]]
-val_data = [emotion_data[i] for i in random_indices[train_size:]]
-
-train_dataset = Dataset.from_list(train_data)
-val_dataset = Dataset.from_list(val_data)
+# 分布式训练：用 torchrun 启动时（WORLD_SIZE > 1）在 CPU 上使用 gloo 后端做数据并行
+from emotion_distributed import world_size
 
-dataset = DatasetDict({
-    'train': train_dataset,
-    'validation': val_dataset
-})
+# 3. 创建数据集
+# config.json 中设置 data_files（CSV/JSONL/Parquet 文件或文件列表）时从外部文件流式读取，
+# 否则使用上面的内置数据
+data_files = config.get("data_files")
+streaming = bool(data_files)
+if streaming:
+    from itertools import islice
+    from emotion_ingest import load_streaming_corpus
+    # 分布式训练时由 accelerate 按进程切分流式训练集（dispatch_batches=False），这里不再手动分片
+    dataset = load_streaming_corpus(data_files, val_ratio=config.get("val_ratio", 0.2), seed=42)
+    # 训练中评估以及量化、蒸馏报告使用的验证样本（只取前 eval_samples 条）
+    val_data = list(islice(dataset["validation"], config.get("eval_samples", 2000)))
+else:
+    np.random.seed(42)
+    random_indices = np.random.permutation(len(emotion_data))
+    train_size = int(0.8 * len(emotion_data))
+
+    train_data = [emotion_data[i] for i in random_indices[:train_size]]
+    val_data = [emotion_data[i] for i in random_indices[train_size:]]
+
+    train_dataset = Dataset.from_list(train_data)
+    val_dataset = Dataset.from_list(val_data)
+
+    dataset = DatasetDict({
+        'train': train_dataset,
+        'validation': val_dataset
+    })
+
+# 3.1 只重训分类头：冻结 ./emotion_model 的编码器，编码器只跑一遍并缓存句向量（config.json 中设置 head_only 开启）
+if config.get("head_only"):
+    from emotion_head import retrain_head
+    retrain_head(
+        config.get("head_base_model", "./emotion_model"),
+        dataset["train"] if streaming else train_data,
+        dataset["validation"] if streaming else val_data,
+        pooling=config.get("head_pooling", "pooler"),
+        output_dir=config.get("head_output_dir"),
+        epochs=config.get("head_epochs", 30)
+    )
+    raise SystemExit(0)
 
 # 4. 模型和分词器
 # 使���较小的中文模型
@@ -175,47 +203,50 @@ except Exception as e:
     model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=3)
 
 # 5. 数据预处理
+max_length = 128
+
 def tokenize_function(examples):
-    # 添加简单的数据增强
-    texts = examples["text"]
-    labels = examples["label"]
-    augmented_texts = []
-    augmented_labels = []
-    
-    for text, label in zip(texts, labels):
-        # 原始文本
-        augmented_texts.append(text)
-        augmented_labels.append(label)
-        # 添加标点符号变体
-        augmented_texts.append(text.replace('！', '!').replace('。', '.'))
-        augmented_labels.append(label)
-        
+    # 只做分词，保留 text 列；数据增强在组批时按概率进行（见 emotion_augment.py）
+    # 不在这里填充，组批时填充到批内最长长度
     tokenized = tokenizer(
-        augmented_texts,
-        padding="max_length",
+        examples["text"],
         truncation=True,
-        max_length=128
+        max_length=max_length
     )
     
     # 添加标签
-    tokenized["labels"] = augmented_labels
+    tokenized["labels"] = examples["label"]
     return tokenized
 
-tokenized_dataset = dataset.map(
-    tokenize_function,
-    batched=True,
-    remove_columns=dataset["train"].column_names
-)
+if streaming:
+    # 流式数据集在迭代时才分词
+    tokenized_dataset = dataset.map(tokenize_function, batched=True, remove_columns=["label"])
+    # 验证集是对整个语料的哈希过滤，每次评估都要重读全部语料；改为只评估一次性取出的 eval_samples 条样本
+    tokenized_dataset["validation"] = Dataset.from_list(val_data).map(
+        tokenize_function, batched=True, remove_columns=["label"]
+    )
+else:
+    # 分词结果按内容缓存到 ./tokenized_cache，重复实验时直接加载
+    from emotion_token_cache import cached_tokenize
+    tokenized_dataset = cached_tokenize(
+        dataset,
+        tokenize_function,
+        tokenizer,
+        max_length,
+        settings={"padding": "dynamic"},
+        batched=True,
+        remove_columns=["label"]
+    )
 
-# 在训练之前添加数据验证
-print("训练集大小:", len(tokenized_dataset["train"]))
-print("验证集大小:", len(tokenized_dataset["validation"]))
+    # 在训练之前添加数据验证
+    print("训练集大小:", len(tokenized_dataset["train"]))
+    print("验证集大小:", len(tokenized_dataset["validation"]))
 
-# 检查数据集的结构
-print("数据集字段:", tokenized_dataset["train"].features)
+    # 检查数据集的结构
+    print("数据集字段:", tokenized_dataset["train"].features)
 
-# 确保标签在正确范围内
-assert all(0 <= label <= 2 for label in dataset["train"]["label"]), "标��值超出预期范围"
+    # 确保标签在正确范围内
+    assert all(0 <= label <= 2 for label in dataset["train"]["label"]), "标签值超出预期范围"
 
 # 6. 训练参数
 training_args = TrainingArguments(
@@ -235,7 +266,13 @@ training_args = TrainingArguments(
     learning_rate=1e-5,
     save_total_limit=2,
     metric_for_best_model="accuracy",
-    gradient_accumulation_steps=2
+    gradient_accumulation_steps=2,
+    max_steps=config.get("max_steps", -1),  # 流式数据集长度未知，必须设置 max_steps
+    group_by_length=not streaming,    # 长度相近的样本分到同一批，减少填充
+    remove_unused_columns=False,      # 保留 text 列供组批时的数据增强使用
+    ddp_backend="gloo" if world_size() > 1 else None,
+    # 每个进程各自读取流式数据中属于自己的分片，不由 rank 0 读取后分发
+    accelerator_config={"dispatch_batches": False} if streaming else None
 )
 
 def compute_metrics(pred):
@@ -250,22 +287,62 @@ def compute_metrics(pred):
         'recall': recall
     }
 
+# 6.1 LoRA 参数高效微调：config.json 中设置 lora（如 {"r": 8, "alpha": 16}）时冻结基础模型，只训练低秩适配器
+lora_config = config.get("lora")
+if lora_config:
+    from emotion_lora import apply_lora
+    model = apply_lora(
+        model,
+        r=lora_config.get("r", 8),
+        alpha=lora_config.get("alpha", 16),
+        dropout=lora_config.get("dropout", 0.1)
+    )
+    training_args.learning_rate = lora_config.get("learning_rate", 2e-4)
+
 # 7. 训练器
-trainer = Trainer(
+# 组批时的数据增强：config.json 中可配置 augmenters（增强方式列表）和 augment_prob（增强概率）
+from emotion_augment import LazyAugmentCollator
+augment_collator = LazyAugmentCollator(
+    tokenizer,
+    augmenters=config.get("augmenters", ["punct_ascii"]),
+    prob=config.get("augment_prob", 0.5),
+    max_length=max_length
+)
+
+# config.json 中设置 max_tokens_per_batch 时按 token 预算组批，否则按 per_device_train_batch_size 组批
+from emotion_batching import TokenBudgetTrainer
+trainer = TokenBudgetTrainer(
     model=model,
     args=training_args,
     train_dataset=tokenized_dataset["train"],
     eval_dataset=tokenized_dataset["validation"],
-    compute_metrics=compute_metrics  # 添加评估指标
+    data_collator=augment_collator,
+    eval_data_collator=augment_collator.without_augmentation(),
+    compute_metrics=compute_metrics,  # 添加评估指标
+    max_tokens_per_batch=config.get("max_tokens_per_batch")
 )
 
 # 8. 训练模型
 trainer.train()
 
+# LoRA 模式只保存适配器（到 ./emotion_adapters/<名称>），不保存完整模型
+if lora_config:
+    if trainer.is_world_process_zero():
+        from emotion_lora import adapter_root, save_adapter
+        save_adapter(
+            trainer.model,
+            config.get("lora_output_dir", f"{adapter_root}/default"),
+            {str(v): k for k, v in label_dict.items()}
+        )
+    raise SystemExit(0)
+
 # 9. 保存模型和分词器
 model_save_path = "./emotion_model"
-tokenizer.save_pretrained(model_save_path)  # ��存分词器
-trainer.save_model(model_save_path)         # 保存模型
+trainer.save_model(model_save_path)         # 保存模型（分布式训练时只有 rank 0 写文件）
+if not trainer.is_world_process_zero():
+    # 其余进程到此结束，后续的保存、量化、蒸馏和上传只在 rank 0 上进行
+    raise SystemExit(0)
+tokenizer.save_pretrained(model_save_path)  # 保存分词器
 
 # 10. 保存标签映射
 import json
@@ -273,6 +350,46 @@ label_map = {str(v): k for k, v in label_dict.items()}  # 修改：将数字键
 with open(f"{model_save_path}/label_map.json", "w", encoding="utf-8") as f:
     json.dump(label_map, f, ensure_ascii=False, indent=2)
 
+# 10.1 保存 INT8 动态量化模型（./emotion_model_int8），并在验证集上生成精度报告
+from emotion_quantize import quantize_and_report
+quantize_and_report(
+    trainer.model.cpu(),
+    tokenizer,
+    model_save_path,
+    [item["text"] for item in val_data],
+    [item["label"] for item in val_data]
+)
+
+# 10.2 知识蒸馏：以微调后的模型为教师训练 3/4 层学生模型（在 config.json 中设置 distill_student_layers 开启）
+distill_student_layers = config.get("distill_student_layers", [])
+if distill_student_layers and world_size() > 1:
+    print("分布式训练时跳过蒸馏，请在训练完成后单进程运行蒸馏")
+elif distill_student_layers:
+    from emotion_distill import run_distillation
+    run_distillation(
+        trainer.model,
+        tokenizer,
+        tokenized_dataset,
+        tokenize_function,
+        val_data,
+        distill_student_layers,
+        model_save_path,
+        compute_metrics=compute_metrics,
+        unlabeled_path=config.get("distill_unlabeled_path"),
+        unlabeled_ratio=config.get("distill_unlabeled_ratio", 0.3),
+        max_steps=config.get("max_steps", -1)
+    )
+
+# 10.3 发布为模型版本库的新版本（config.json 中设置 registry_publish 开启），放在最后以包含 accuracy_report.json
+# 使用 ModelHandle 的服务会在后台加载并热切换；同时设置 registry_shadow 时只设为影子版本，不切换
+if config.get("registry_publish", False):
+    from model_registry import ModelRegistry
+    registry_shadow = config.get("registry_shadow", False)
+    version = ModelRegistry(config.get("registry_root", "./model_registry")).publish(
+        model_save_path, activate=not registry_shadow, shadow=registry_shadow
+    )
+    print(f"已发布模型版本: {version}")
+
 # 11. 上传模型到 Hugging Face Hub
 # 定义您的模型信息
 repo_name = "chinese-emotion-classifier"  # 您想要的仓库名称
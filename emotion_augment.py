@@ -0,0 +1,81 @@
+import random
+import re
+
+# 增强函数注册表：名称 -> 函数(text, rng) -> 增强后的文本
+AUGMENTERS = {}
+
+
+def register_augmenter(name):
+    """注册一个数据增强函数"""
+    def decorator(func):
+        AUGMENTERS[name] = func
+        return func
+    return decorator
+
+
+@register_augmenter("punct_ascii")
+def punct_ascii(text, rng):
+    """全角标点替换为半角（原 tokenize_function 中的标点符号变体）"""
+    return text.replace('！', '!').replace('。', '.')
+
+
+@register_augmenter("drop_punct")
+def drop_punct(text, rng):
+    """去掉句末标点"""
+    return re.sub(r"[！!。.？?，,~～]+$", "", text) or text
+
+
+@register_augmenter("repeat_punct")
+def repeat_punct(text, rng):
+    """重复句末感叹号/句号，模拟口语化表达"""
+    return re.sub(r"([！!。])$", lambda m: m.group(1) * rng.randint(2, 3), text)
+
+
+@register_augmenter("char_dropout")
+def char_dropout(text, rng):
+    """随机删除一个字符（至少保留 5 个字符）"""
+    if len(text) <= 5:
+        return text
+    i = rng.randrange(len(text))
+    return text[:i] + text[i + 1:]
+
+
+class LazyAugmentCollator:
+    """在组批时按概率对原文做增强，只重新分词被增强的样本，然后动态填充
+
+    数据集需要保留 text 列（TrainingArguments 中设置 remove_unused_columns=False），
+    未被增强的样本直接使用预先分好的 input_ids。
+    """
+
+    def __init__(self, tokenizer, augmenters=("punct_ascii",), prob=0.5, max_length=128, seed=42):
+        unknown = [name for name in augmenters if name not in AUGMENTERS]
+        if unknown:
+            raise ValueError(f"未注册的增强方式: {unknown}，可选 {sorted(AUGMENTERS)}")
+        self.tokenizer = tokenizer
+        self.augmenters = [AUGMENTERS[name] for name in augmenters]
+        self.prob = prob
+        self.max_length = max_length
+        self.rng = random.Random(seed)
+
+    def __call__(self, features):
+        features = [dict(feature) for feature in features]
+        changed = []
+        for i, feature in enumerate(features):
+            text = feature.pop("text", None)
+            if text is None or not self.augmenters or self.rng.random() >= self.prob:
+                continue
+            augmented = self.rng.choice(self.augmenters)(text, self.rng)
+            if augmented != text:
+                changed.append((i, augmented))
+
+        if changed:
+            # 被增强的样本一次性批量重新分词
+            encoded = self.tokenizer([text for _, text in changed], truncation=True, max_length=self.max_length)
+            for j, (i, _) in enumerate(changed):
+                for key in encoded.keys():
+                    features[i][key] = encoded[key][j]
+        return self.tokenizer.pad(features, padding="longest", return_tensors="pt")
+
+    def without_augmentation(self):
+        """评估用的同一 collator（不做增强）"""
+        return LazyAugmentCollator(self.tokenizer, augmenters=(), prob=0.0, max_length=self.max_length)
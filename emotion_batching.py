@@ -0,0 +1,171 @@
+import argparse
+import multiprocessing as mp
+import queue as queue_module
+import random
+import resource
+import time
+
+from torch.utils.data import DataLoader
+from datasets import IterableDataset
+from transformers import Trainer
+
+from emotion_scheduler import plan_batches
+
+
+class TokenBudgetBatchSampler:
+    """按 token 预算组批（批大小 × 批内最长长度 ≤ max_tokens），每个 epoch 打乱批次顺序"""
+
+    def __init__(self, lengths, max_tokens=4096, max_batch_size=256, seed=42):
+        self.batches = plan_batches(lengths, max_tokens, max_batch_size)
+        self.seed = seed
+        self.epoch = 0
+
+    def __iter__(self):
+        batches = list(self.batches)
+        random.Random(self.seed + self.epoch).shuffle(batches)
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self):
+        return len(self.batches)
+
+
+class TokenBudgetTrainer(Trainer):
+    """训练集按 token 预算组批的 Trainer；max_tokens_per_batch 为 None 时与 Trainer 完全一致
+
+    eval_data_collator 用于评估集（例如不做数据增强的 collator），未设置时与训练集相同。
+    """
+
+    def __init__(self, *args, max_tokens_per_batch=None, eval_data_collator=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.eval_data_collator = eval_data_collator
+
+    def get_eval_dataloader(self, eval_dataset=None):
+        if self.eval_data_collator is None:
+            return super().get_eval_dataloader(eval_dataset)
+        train_collator = self.data_collator
+        self.data_collator = self.eval_data_collator
+        try:
+            return super().get_eval_dataloader(eval_dataset)
+        finally:
+            self.data_collator = train_collator
+
+    def get_train_dataloader(self):
+        # 流式数据集长度未知，无法预先按 token 预算组批
+        if not self.max_tokens_per_batch or isinstance(self.train_dataset, IterableDataset):
+            return super().get_train_dataloader()
+        lengths = [len(ids) for ids in self.train_dataset["input_ids"]]
+        sampler = TokenBudgetBatchSampler(lengths, self.max_tokens_per_batch, seed=self.args.seed)
+        # 交给 accelerate 包装：分布式训练时各进程轮流取不同的批次，而不是每个进程都训练全部批次
+        return self.accelerator.prepare(DataLoader(
+            self.train_dataset,
+            batch_sampler=sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory
+        ))
+
+
+def _train_steps(mode, model_name, texts, labels, batch_size, max_tokens, steps, queue):
+    """在子进程中跑若干训练步，测量 samples/sec 和峰值内存"""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, DataCollatorWithPadding
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=3)
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-5)
+    collator = DataCollatorWithPadding(tokenizer)
+
+    padding = "max_length" if mode == "max_length" else False
+    encoded = tokenizer(texts, padding=padding, truncation=True, max_length=128)
+    features = [{key: encoded[key][i] for key in encoded.keys()} for i in range(len(texts))]
+    for feature, label in zip(features, labels):
+        feature["labels"] = label
+
+    if mode == "token_budget":
+        batches = TokenBudgetBatchSampler([len(f["input_ids"]) for f in features], max_tokens).batches
+    else:
+        indices = list(range(len(features)))
+        random.Random(42).shuffle(indices)
+        batches = [indices[i:i + batch_size] for i in range(0, len(indices), batch_size)]
+
+    samples = 0
+    start = time.perf_counter()
+    for step in range(steps):
+        batch = collator([features[i] for i in batches[step % len(batches)]])
+        loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        samples += len(batch["labels"])
+    elapsed = time.perf_counter() - start
+    # Linux 下 ru_maxrss 的单位是 KB
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put({"mode": mode, "samples_per_sec": samples / elapsed, "peak_memory_mb": peak_mb})
+
+
+def _wait_result(process, queue, mode, timeout):
+    """等待子进程的结果；子进程崩溃（OOM、导入失败等）或超时时报错，而不是一直阻塞"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return queue.get(timeout=1.0)
+        except queue_module.Empty:
+            pass
+        if not process.is_alive():
+            # 子进程可能刚好在放入结果后退出
+            try:
+                return queue.get(timeout=1.0)
+            except queue_module.Empty:
+                raise RuntimeError(f"{mode} 子进程异常退出（exitcode={process.exitcode}）")
+        if time.monotonic() > deadline:
+            process.terminate()
+            process.join()
+            raise TimeoutError(f"{mode} 子进程超过 {timeout} 秒没有返回结果")
+
+
+def benchmark_padding(texts, labels, model_name="hfl/chinese-bert-wwm-ext", batch_size=16, max_tokens=1024, steps=30,
+                      timeout=1800):
+    """对比固定填充到 128、动态填充和 token 预算组批三种方式（每种方式在独立进程中运行）"""
+    context = mp.get_context("spawn")
+    results = []
+    for mode in ("max_length", "dynamic", "token_budget"):
+        queue = context.Queue()
+        process = context.Process(
+            target=_train_steps,
+            args=(mode, model_name, texts, labels, batch_size, max_tokens, steps, queue)
+        )
+        process.start()
+        results.append(_wait_result(process, queue, mode, timeout))
+        process.join()
+    return results
+
+
+def main():
+    import pandas as pd
+    from emotion_labels import to_label_id
+
+    parser = argparse.ArgumentParser(description="训练批处理方式对比：samples/sec 与峰值内存")
+    parser.add_argument("--data", default="emotion_data.csv")
+    parser.add_argument("--model", default="hfl/chinese-bert-wwm-ext")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=1024)
+    parser.add_argument("--steps", type=int, default=30)
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data).dropna(subset=["text", "label"])
+    texts = data["text"].tolist()
+    labels = [to_label_id(label) for label in data["label"]]
+    results = benchmark_padding(texts, labels, args.model, args.batch_size, args.max_tokens, args.steps)
+
+    print("\n=== 训练批处理对比 ===")
+    baseline = results[0]["samples_per_sec"]
+    for item in results:
+        print(f"{item['mode']:>12}: {item['samples_per_sec']:.1f} samples/sec "
+              f"({item['samples_per_sec'] / baseline:.2f}x), 峰值内存 {item['peak_memory_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text):
+    """缓存键使用的文本规范化：NFKC（全角转半角）、去除首尾空白、合并连续空白"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def model_version(model_dir, variant="fp32"):
+    """根据模型目录中的文件名、大小和修改时间生成模型版本号"""
+    digest = hashlib.sha256(variant.encode("utf-8"))
+    if os.path.isdir(model_dir):
+        for name in sorted(os.listdir(model_dir)):
+            stat = os.stat(os.path.join(model_dir, name))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """预测结果缓存：内存 LRU/TTL 一级缓存 + 可选的 SQLite 磁盘二级缓存"""
+
+    def __init__(self, version, maxsize=10000, ttl=None, disk_path=None):
+        self.version = version
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_path = disk_path
+        self._disk = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._open_disk()
+
+    def _open_disk(self):
+        self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, probs BLOB, created REAL)"
+        )
+        self._disk.commit()
+
+    def after_fork(self):
+        """fork 出的子进程不能沿用父进程的 SQLite 连接，需要重新打开"""
+        self._lock = threading.Lock()
+        if self.disk_path:
+            self._open_disk()
+
+    def key(self, text):
+        """键 = sha256(模型版本 + 规范化文本)"""
+        return hashlib.sha256(f"{self.version}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key, probs, created):
+        self._memory[key] = (probs, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, text):
+        """查询缓存，未命中返回 None"""
+        key = self.key(text)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT probs, created FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    probs = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, probs, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return probs
+            self.misses += 1
+            return None
+
+    def put_many(self, texts, probs):
+        """写入一批预测结果"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for text, row in zip(texts, probs):
+                key = self.key(text)
+                row = np.asarray(row, dtype=np.float32)
+                self._remember(key, row, now)
+                rows.append((key, row.tobytes(), now))
+            if self._disk is not None and rows:
+                self._disk.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)", rows)
+                self._disk.commit()
+
+    def predict(self, texts, predict_fn):
+        """先查缓存，只把未命中的文本（去重后）交给 predict_fn 批量计算"""
+        texts = list(texts)
+        if not texts:
+            return predict_fn(texts)
+        results = [self.get(text) if self.maxsize > 0 else None for text in texts]
+        pending = OrderedDict()
+        for i, (text, probs) in enumerate(zip(texts, results)):
+            if probs is None:
+                pending.setdefault(normalize_text(text), []).append(i)
+        if pending:
+            miss_texts = [texts[indices[0]] for indices in pending.values()]
+            miss_probs = predict_fn(miss_texts)
+            if self.maxsize > 0:
+                self.put_many(miss_texts, miss_probs)
+            for indices, probs in zip(pending.values(), miss_probs):
+                for i in indices:
+                    results[i] = probs
+        return np.stack(results).astype(np.float32)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._memory),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM predictions")
+                self._disk.commit()
@@ -0,0 +1,127 @@
+import argparse
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from emotion_ingest import split_bucket
+from emotion_labels import label_dict, to_label_id
+
+fast_model_path = "./emotion_model_ngram.joblib"
+
+
+def train_fast_model(texts, labels, ngram_range=(1, 3)):
+    """训练字符 n-gram + 逻辑回归的快速模型，标签与 Emo4.py 的 label_dict 一致"""
+    model = make_pipeline(
+        TfidfVectorizer(analyzer="char", ngram_range=ngram_range, sublinear_tf=True, min_df=1),
+        LogisticRegression(max_iter=1000, C=10.0)
+    )
+    model.fit(list(texts), [to_label_id(label) for label in labels])
+    return model
+
+
+def fast_predict_proba(fast_model, texts):
+    """一次向量化计算全部文本的概率，列顺序与标签编号对齐"""
+    probs = np.zeros((len(texts), len(label_dict)), dtype=np.float32)
+    if len(texts):
+        probs[:, fast_model.classes_] = fast_model.predict_proba(list(texts))
+    return probs
+
+
+class CascadeClassifier:
+    """两级级联：快速模型置信度不低于阈值的文本提前退出，其余交给 BERT"""
+
+    def __init__(self, fast_model, bert_predict_fn, threshold=0.9):
+        self.fast_model = fast_model
+        self.bert_predict_fn = bert_predict_fn
+        self.threshold = threshold
+        self.stats = {"texts": 0, "early_exit": 0, "seconds": 0.0}
+
+    def predict_emotions(self, texts):
+        """返回形状为 (len(texts), 标签数) 的概率数组"""
+        texts = list(texts)
+        start = time.perf_counter()
+        probs = fast_predict_proba(self.fast_model, texts)
+        uncertain = np.flatnonzero(probs.max(axis=-1) < self.threshold)
+        if len(uncertain):
+            probs[uncertain] = self.bert_predict_fn([texts[i] for i in uncertain])
+        self.stats["texts"] += len(texts)
+        self.stats["early_exit"] += len(texts) - len(uncertain)
+        self.stats["seconds"] += time.perf_counter() - start
+        return probs
+
+    def report(self):
+        texts = self.stats["texts"]
+        seconds = self.stats["seconds"]
+        return {
+            "texts": texts,
+            "early_exit_rate": self.stats["early_exit"] / texts if texts else 0.0,
+            "texts_per_sec": texts / seconds if seconds else 0.0,
+        }
+
+
+def load_labeled_csv(path, split=None, val_ratio=0.2, seed=42):
+    """读取 emotion_data.csv 格式的数据（text 列，label 列为标签名或编号）
+
+    split 为 "train" / "validation" 时按文本哈希划分（与 emotion_ingest 相同），只返回对应部分。
+    """
+    data = pd.read_csv(path).dropna(subset=["text", "label"])
+    if split is not None:
+        held_out = data["text"].map(lambda text: split_bucket(text, seed) < val_ratio)
+        data = data[held_out if split == "validation" else ~held_out]
+        if data.empty:
+            raise ValueError(f"{path} 按 val_ratio={val_ratio} 划分后 {split} 部分没有数据")
+    return data["text"].tolist(), [to_label_id(label) for label in data["label"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字符 n-gram 快速模型 + BERT 级联分类")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="训练快速模型")
+    train_parser.add_argument("--data", default="emotion_data.csv")
+    train_parser.add_argument("--output", default=fast_model_path)
+    train_parser.add_argument("--val-ratio", type=float, default=0.2, help="留给 eval 的验证集比例，训练时不使用")
+
+    eval_parser = subparsers.add_parser("eval", help="评估级联效果")
+    eval_parser.add_argument("--data", required=True,
+                             help="评估数据；如果是快速模型的训练文件，需同时设置 --val-ratio，否则会高估准确率和提前退出比例")
+    eval_parser.add_argument("--fast-model", default=fast_model_path)
+    eval_parser.add_argument("--threshold", type=float, default=0.9)
+    eval_parser.add_argument("--val-ratio", type=float, default=None,
+                             help="--data 是训练文件时设为与 train 相同的值，只评估训练时留出的部分；不设置时评估全部数据")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        texts, labels = load_labeled_csv(args.data, "train", args.val_ratio)
+        joblib.dump(train_fast_model(texts, labels), args.output)
+        print(f"快速模型已保存到: {args.output}（训练样本 {len(texts)} 条）")
+        return
+
+    from test_emotion import predict_emotions
+
+    if args.val_ratio is None:
+        texts, labels = load_labeled_csv(args.data)
+    else:
+        texts, labels = load_labeled_csv(args.data, "validation", args.val_ratio)
+    cascade = CascadeClassifier(joblib.load(args.fast_model), predict_emotions, threshold=args.threshold)
+    preds = cascade.predict_emotions(texts).argmax(axis=-1)
+    report = cascade.report()
+
+    start = time.perf_counter()
+    predict_emotions(texts)
+    bert_rate = len(texts) / (time.perf_counter() - start)
+
+    print("\n=== 级联分类评估 ===")
+    print(f"文本数: {report['texts']}")
+    print(f"提前退出比例: {report['early_exit_rate']:.1%}")
+    print(f"端到端吞吐量: {report['texts_per_sec']:.1f} 条/秒（仅 BERT: {bert_rate:.1f} 条/秒）")
+    print(f"准确率: {float((preds == np.asarray(labels)).mean()):.4f}")
+
+
+if __name__ == "__main__":
+    main()
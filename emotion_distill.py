@@ -0,0 +1,153 @@
+import copy
+import json
+import os
+
+import pandas as pd
+import torch
+import torch.nn.functional as F
+from datasets import Dataset, IterableDataset, concatenate_datasets, interleave_datasets
+from transformers import AutoModelForSequenceClassification, DataCollatorWithPadding, Trainer, TrainingArguments
+
+from emotion_quantize import accuracy_report, print_report
+
+
+def build_student(teacher, num_layers):
+    """构建层数更少的学生模型，并用教师的嵌入层和均匀间隔的编码层初始化"""
+    config = copy.deepcopy(teacher.config)
+    teacher_layers = config.num_hidden_layers
+    config.num_hidden_layers = num_layers
+    student = AutoModelForSequenceClassification.from_config(config)
+
+    teacher_base = getattr(teacher, teacher.base_model_prefix)
+    student_base = getattr(student, student.base_model_prefix)
+    student_base.embeddings.load_state_dict(teacher_base.embeddings.state_dict())
+    if getattr(teacher_base, "pooler", None) is not None:
+        student_base.pooler.load_state_dict(teacher_base.pooler.state_dict())
+    student.classifier.load_state_dict(teacher.classifier.state_dict())
+
+    # 例如 12 层教师 -> 4 层学生，取第 0、4、8、11 层
+    step = (teacher_layers - 1) / max(num_layers - 1, 1)
+    for i in range(num_layers):
+        source = round(i * step)
+        student_base.encoder.layer[i].load_state_dict(teacher_base.encoder.layer[source].state_dict())
+    return student
+
+
+class DistillationTrainer(Trainer):
+    """在软标签上训练学生模型：KL(学生 || 教师) 与有标签样本上的交叉熵加权"""
+
+    def __init__(self, *args, teacher=None, temperature=2.0, alpha=0.7, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher = teacher.to(self.args.device)
+        self.teacher.eval()
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        labels = inputs.pop("labels")
+        outputs = model(**inputs)
+        with torch.no_grad():
+            teacher_logits = self.teacher(**inputs).logits
+
+        t = self.temperature
+        loss = F.kl_div(
+            F.log_softmax(outputs.logits / t, dim=-1),
+            F.softmax(teacher_logits / t, dim=-1),
+            reduction="batchmean"
+        ) * (t * t)
+        # 无标签样本的 label 为 -100，只参与蒸馏损失；整批都无标签时交叉熵记为 0，
+        # 蒸馏项的权重始终是 alpha，损失的量级不随批内有无标签样本跳变
+        if (labels != -100).any():
+            ce = F.cross_entropy(outputs.logits, labels, ignore_index=-100)
+        else:
+            ce = loss.new_zeros(())
+        loss = self.alpha * loss + (1 - self.alpha) * ce
+        return (loss, outputs) if return_outputs else loss
+
+
+def load_unlabeled_texts(path):
+    """读取无标签文本：CSV/JSONL 取 text 列，其他格式按行读取"""
+    if path.endswith(".csv"):
+        return pd.read_csv(path)["text"].dropna().tolist()
+    if path.endswith(".jsonl"):
+        return pd.read_json(path, lines=True)["text"].dropna().tolist()
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def run_distillation(teacher, tokenizer, tokenized_dataset, tokenize_function, val_data, student_layers,
+                     model_save_path, compute_metrics=None, unlabeled_path=None, num_train_epochs=10,
+                     max_steps=-1, unlabeled_ratio=0.3):
+    """为每个层数训练一个学生模型，保存到 {model_save_path}_student_{n}L 并输出精度与延迟报告
+
+    流式训练集与无标签文本按 unlabeled_ratio 交错采样，设置 max_steps 时也能用到无标签文本。
+    """
+    train_dataset = tokenized_dataset["train"]
+    if unlabeled_path:
+        texts = load_unlabeled_texts(unlabeled_path)
+        unlabeled = Dataset.from_dict({"text": texts, "label": [-100] * len(texts)})
+        unlabeled = unlabeled.map(tokenize_function, batched=True, remove_columns=["label"])
+        if isinstance(train_dataset, IterableDataset):
+            # 直接拼接会把无标签文本放在整个流的末尾，训练往往在读到它之前就达到 max_steps
+            train_dataset = interleave_datasets(
+                [train_dataset, unlabeled.to_iterable_dataset()],
+                probabilities=[1 - unlabeled_ratio, unlabeled_ratio],
+                seed=42,
+                stopping_strategy="all_exhausted"
+            )
+        else:
+            train_dataset = concatenate_datasets([train_dataset, unlabeled])
+        print(f"加入无标签文本 {len(texts)} 条用于蒸馏")
+
+    variants = {"teacher": teacher}
+    for num_layers in student_layers:
+        student = build_student(teacher, num_layers)
+        training_args = TrainingArguments(
+            output_dir=f"./results_student_{num_layers}L",
+            num_train_epochs=num_train_epochs,
+            max_steps=max_steps,
+            per_device_train_batch_size=16,
+            per_device_eval_batch_size=16,
+            learning_rate=5e-5,
+            weight_decay=0.01,
+            logging_steps=10,
+            eval_strategy="epoch",
+            save_strategy="no",
+            group_by_length=not isinstance(train_dataset, IterableDataset),
+            report_to=[]
+        )
+        trainer = DistillationTrainer(
+            model=student,
+            args=training_args,
+            train_dataset=train_dataset,
+            eval_dataset=tokenized_dataset["validation"],
+            data_collator=DataCollatorWithPadding(tokenizer),
+            compute_metrics=compute_metrics,
+            teacher=teacher
+        )
+        trainer.train()
+
+        output_dir = f"{model_save_path}_student_{num_layers}L"
+        tokenizer.save_pretrained(output_dir)
+        trainer.save_model(output_dir)
+        label_map_file = f"{model_save_path}/label_map.json"
+        if os.path.exists(label_map_file):
+            with open(label_map_file, "r", encoding="utf-8") as f:
+                label_map = json.load(f)
+            with open(f"{output_dir}/label_map.json", "w", encoding="utf-8") as f:
+                json.dump(label_map, f, ensure_ascii=False, indent=2)
+        variants[f"{num_layers}L"] = trainer.model.cpu()
+
+    teacher.cpu()
+    report = accuracy_report(
+        variants,
+        tokenizer,
+        [item["text"] for item in val_data],
+        [item["label"] for item in val_data],
+        baseline="teacher"
+    )
+    print_report(report)
+    for num_layers in student_layers:
+        with open(f"{model_save_path}_student_{num_layers}L/distill_report.json", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def world_size():
+    """torchrun 启动时由环境变量给出的进程总数"""
+    return int(os.getenv("WORLD_SIZE", "1"))
+
+
+def required_rows(worker_counts, batch_size, steps):
+    """进程数最多时，每个进程在一个 epoch 内也要有 steps + 1（含预热）个完整批次"""
+    return max(worker_counts) * batch_size * (steps + 1)
+
+
+def make_benchmark_corpus(path, n, seed=42, source="emotion_data.csv"):
+    """用 source 中同一标签的 1~3 个句子拼接出 n 条样本，写成 text,label 的 CSV"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    data = pd.read_csv(source).dropna(subset=["text", "label"])
+    groups = {label: group["text"].tolist() for label, group in data.groupby("label")}
+    labels = list(groups)
+    rows = []
+    for _ in range(n):
+        label = labels[int(rng.integers(len(labels)))]
+        texts = groups[label]
+        picks = rng.integers(len(texts), size=int(rng.integers(1, 4)))
+        rows.append({"text": "".join(texts[i] for i in picks), "label": label})
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+def count_rows(data_path):
+    import pandas as pd
+    return len(pd.read_csv(data_path).dropna(subset=["text", "label"]))
+
+
+def _worker(model_name, data_path, batch_size, steps):
+    """单个训练进程：gloo 后端 + DistributedSampler 分片 + DDP 梯度同步"""
+    import pandas as pd
+    import torch
+    import torch.distributed as dist
+    from torch.nn.parallel import DistributedDataParallel
+    from torch.utils.data import DataLoader, DistributedSampler
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, DataCollatorWithPadding
+    from emotion_labels import to_label_id
+
+    dist.init_process_group(backend="gloo")
+    # 每个进程平分本机核数，避免线程超额订阅
+    local_world_size = int(os.getenv("LOCAL_WORLD_SIZE", "1"))
+    torch.set_num_threads(max((os.cpu_count() or 1) // local_world_size, 1))
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=3)
+    model = DistributedDataParallel(model)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-5)
+
+    data = pd.read_csv(data_path).dropna(subset=["text", "label"])
+    encoded = tokenizer(data["text"].tolist(), truncation=True, max_length=128)
+    # idx 用于统计各进程实际训练到的样本，检查分片是否覆盖全部数据且没有重复
+    features = [
+        {**{key: encoded[key][i] for key in encoded.keys()}, "labels": to_label_id(label), "idx": i}
+        for i, label in enumerate(data["label"])
+    ]
+    sampler = DistributedSampler(features, shuffle=True, seed=42)
+    loader = DataLoader(features, batch_size=batch_size, sampler=sampler, collate_fn=DataCollatorWithPadding(tokenizer))
+
+    def batches():
+        epoch = 0
+        while True:
+            sampler.set_epoch(epoch)
+            yield from loader
+            epoch += 1
+
+    model.train()
+    iterator = batches()
+    # 预热一步，不计入计时
+    seen = next(iterator).pop("idx").tolist()
+    dist.barrier()
+    samples = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        batch = next(iterator)
+        seen.extend(batch.pop("idx").tolist())
+        loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        samples += len(batch["labels"])
+    dist.barrier()
+    elapsed = time.perf_counter() - start
+
+    total = torch.tensor([samples], dtype=torch.float64)
+    dist.all_reduce(total)
+    all_seen = [None] * dist.get_world_size()
+    dist.all_gather_object(all_seen, seen)
+    if dist.get_rank() == 0:
+        seen_total = sum(len(items) for items in all_seen)
+        unique = len(set().union(*all_seen))
+        print("RESULT " + json.dumps({
+            "workers": world_size(),
+            "samples_per_sec": total.item() / elapsed,
+            # 训练步数覆盖不到一个 epoch 时，重复样本数应为 0；覆盖率 = 不同样本数 / 数据集大小
+            "unique_examples": unique,
+            "duplicate_examples": seen_total - unique,
+            "coverage": unique / len(features)
+        }))
+    dist.destroy_process_group()
+
+
+def scaling_benchmark(worker_counts=(1, 2, 4, 8), model_name="hfl/chinese-bert-wwm-ext",
+                      data_path=None, batch_size=8, steps=20):
+    """在本机分别用 1/2/4/8 个进程做数据并行训练，测量总 samples/sec
+
+    数据太少时 DistributedSampler 会补齐重复样本、每个进程频繁重新开始 epoch，测到的不是扩展性；
+    因此 data_path 的行数必须足够，不指定时自动生成足够大的语料。
+    """
+    needed = required_rows(worker_counts, batch_size, steps)
+    if data_path is None:
+        data_path = make_benchmark_corpus(
+            os.path.join(tempfile.mkdtemp(prefix="emotion_distributed."), "corpus.csv"), needed)
+    elif count_rows(data_path) < needed:
+        raise ValueError(f"{data_path} 只有 {count_rows(data_path)} 条数据，"
+                         f"{max(worker_counts)} 个进程 × 批大小 {batch_size} × {steps + 1} 步至少需要 {needed} 条")
+    results = []
+    for workers in worker_counts:
+        command = [
+            sys.executable, "-m", "torch.distributed.run",
+            "--standalone", f"--nproc_per_node={workers}",
+            os.path.abspath(__file__), "worker",
+            "--model", model_name, "--data", data_path,
+            "--batch-size", str(batch_size), "--steps", str(steps),
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        line = next(line for line in output.splitlines() if line.startswith("RESULT "))
+        results.append(json.loads(line[len("RESULT "):]))
+    base = results[0]["samples_per_sec"]
+    for item in results:
+        item["speedup"] = item["samples_per_sec"] / base
+        item["efficiency"] = item["speedup"] / (item["workers"] / results[0]["workers"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU 多进程（gloo）数据并行训练的扩展性测试")
+    parser.add_argument("command", choices=["bench", "worker"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--model", default="hfl/chinese-bert-wwm-ext")
+    parser.add_argument("--data", default=None, help="训练数据 CSV；不指定时按进程数、批大小和步数生成足够大的语料")
+    parser.add_argument("--batch-size", type=int, default=8, help="每个进程的批大小")
+    parser.add_argument("--steps", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        if args.data is None:
+            parser.error("worker 需要指定 --data")
+        _worker(args.model, args.data, args.batch_size, args.steps)
+        return
+
+    results = scaling_benchmark(args.workers, args.model, args.data, args.batch_size, args.steps)
+    print("\n=== 数据并行扩展性（gloo）===")
+    for item in results:
+        print(f"{item['workers']:>2} 进程: {item['samples_per_sec']:.1f} samples/sec, "
+              f"加速 {item['speedup']:.2f}x, 并行效率 {item['efficiency']:.0%}, "
+              f"不同样本 {item['unique_examples']}（重复 {item['duplicate_examples']}，覆盖率 {item['coverage']:.1%}）")
+
+
+if __name__ == "__main__":
+    main()
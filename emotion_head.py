@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from itertools import islice
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from emotion_labels import id2label as default_id2label, to_label_id
+from emotion_scheduler import encode_texts, plan_batches
+
+embedding_cache_dir = "./embedding_cache"
+poolings = ("pooler", "cls", "mean")
+
+
+def encoder_fingerprint(model):
+    """编码器权重的哈希；只重训分类头不会改变它，因此缓存的句向量仍然有效"""
+    digest = hashlib.sha256()
+    for name, tensor in sorted(model.base_model.state_dict().items()):
+        digest.update(name.encode("utf-8"))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def pool(outputs, attention_mask, pooling):
+    if pooling == "pooler":
+        # 与 BertForSequenceClassification 的分类头输入一致
+        return outputs.pooler_output
+    if pooling == "cls":
+        return outputs.last_hidden_state[:, 0]
+    mask = attention_mask.unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+    return (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+
+def encode_corpus(records, tokenizer, model, pooling="pooler", cache_dir=embedding_cache_dir,
+                  chunk_size=4096, max_length=128, max_tokens=8192):
+    """编码器只跑一遍，把句向量写入 float16 内存映射文件；数据和编码器不变时直接复用
+
+    records 为可重复迭代的 {"text", "label"} 序列（列表或流式数据集）。
+    返回 (embeddings, labels)，embeddings 为只读 np.memmap。
+    """
+    if pooling not in poolings:
+        raise ValueError(f"不支持的池化方式: {pooling}，可选 {poolings}")
+    digest = hashlib.sha256(f"{encoder_fingerprint(model)}:{pooling}:{max_length}".encode("utf-8"))
+    for record in records:
+        digest.update(f"{record['text']}\0{record['label']}\n".encode("utf-8"))
+    path = os.path.join(cache_dir, digest.hexdigest()[:24])
+    meta_path = os.path.join(path, "meta.json")
+
+    if not os.path.exists(meta_path):
+        start = time.perf_counter()
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        encoder = model.base_model.eval()
+        labels = []
+        count = 0
+        iterator = iter(records)
+        with open(os.path.join(tmp_path, "embeddings.f16"), "wb") as f:
+            while True:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                encodings, lengths = encode_texts([record["text"] for record in chunk], tokenizer, max_length)
+                vectors = np.zeros((len(chunk), encoder.config.hidden_size), dtype=np.float16)
+                for batch in plan_batches(lengths, max_tokens):
+                    inputs = tokenizer.pad([encodings[i] for i in batch], padding="longest", return_tensors="pt")
+                    with torch.no_grad():
+                        outputs = encoder(**inputs)
+                    vectors[batch] = pool(outputs, inputs["attention_mask"], pooling).numpy().astype(np.float16)
+                f.write(vectors.tobytes())
+                labels.extend(to_label_id(record["label"]) for record in chunk)
+                count += len(chunk)
+        np.save(os.path.join(tmp_path, "labels.npy"), np.asarray(labels, dtype=np.int64))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"count": count, "hidden_size": encoder.config.hidden_size, "pooling": pooling,
+                       "encode_seconds": time.perf_counter() - start}, f, indent=2)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        print(f"编码完成（{count} 条，{time.perf_counter() - start:.1f} 秒），句向量已缓存到: {path}")
+    else:
+        print(f"句向量缓存命中: {path}")
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    embeddings = np.memmap(os.path.join(path, "embeddings.f16"), dtype=np.float16, mode="r",
+                           shape=(meta["count"], meta["hidden_size"]))
+    return embeddings, np.load(os.path.join(path, "labels.npy"))
+
+
+def train_head(embeddings, labels, num_labels, init_head=None, epochs=30, batch_size=256, lr=1e-3,
+               weight_decay=0.01, dropout=0.1, seed=42):
+    """在缓存的句向量上训练线性分类头"""
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    head = torch.nn.Linear(embeddings.shape[1], num_labels)
+    if init_head is not None:
+        head.load_state_dict(init_head.state_dict())
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=weight_decay)
+    drop = torch.nn.Dropout(dropout)
+    targets = torch.from_numpy(np.asarray(labels, dtype=np.int64))
+
+    head.train()
+    for _ in range(epochs):
+        order = rng.permutation(len(labels))
+        for start in range(0, len(order), batch_size):
+            # 排序后的下标让内存映射文件按顺序读取
+            idx = np.sort(order[start:start + batch_size])
+            x = torch.from_numpy(np.asarray(embeddings[idx], dtype=np.float32))
+            loss = torch.nn.functional.cross_entropy(head(drop(x)), targets[idx])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    head.eval()
+    return head
+
+
+def head_accuracy(head, embeddings, labels, batch_size=4096):
+    correct = 0
+    with torch.no_grad():
+        for start in range(0, len(labels), batch_size):
+            x = torch.from_numpy(np.asarray(embeddings[start:start + batch_size], dtype=np.float32))
+            correct += int((head(x).argmax(-1).numpy() == labels[start:start + batch_size]).sum())
+    return correct / len(labels) if len(labels) else 0.0
+
+
+def save_head(head, output_dir, pooling, id2label):
+    """单独保存分类头（多租户推理时按租户加载）"""
+    os.makedirs(output_dir, exist_ok=True)
+    torch.save({"pooling": pooling, "id2label": id2label, "state_dict": head.state_dict()},
+               os.path.join(output_dir, "head.pt"))
+
+
+def retrain_head(model_dir, train_records, val_records, pooling="pooler", output_dir=None, epochs=30):
+    """冻结编码器，只重训分类头；pooler 池化时把新分类头装回模型并保存完整模型"""
+    output_dir = output_dir or model_dir
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    try:
+        with open(os.path.join(model_dir, "label_map.json"), "r", encoding="utf-8") as f:
+            id2label = json.load(f)
+    except OSError:
+        id2label = default_id2label
+
+    train_x, train_y = encode_corpus(train_records, tokenizer, model, pooling)
+    val_x, val_y = encode_corpus(val_records, tokenizer, model, pooling)
+
+    start = time.perf_counter()
+    init_head = model.classifier if pooling == "pooler" else None
+    head = train_head(train_x, train_y, len(id2label), init_head=init_head, epochs=epochs)
+    print(f"分类头训练完成，耗时 {time.perf_counter() - start:.1f} 秒，"
+          f"训练集准确率 {head_accuracy(head, train_x, train_y):.4f}，"
+          f"验证集准确率 {head_accuracy(head, val_x, val_y):.4f}")
+
+    save_head(head, output_dir, pooling, id2label)
+    if pooling == "pooler":
+        model.classifier.load_state_dict(head.state_dict())
+        model.save_pretrained(output_dir)
+        tokenizer.save_pretrained(output_dir)
+        with open(os.path.join(output_dir, "label_map.json"), "w", encoding="utf-8") as f:
+            json.dump(id2label, f, ensure_ascii=False, indent=2)
+    return head
@@ -0,0 +1,61 @@
+import hashlib
+
+from datasets import IterableDatasetDict, load_dataset
+
+from emotion_labels import label_dict, to_label_id
+
+# 文件后缀 -> datasets 内置的数据加载器
+builders = {
+    ".csv": "csv",
+    ".jsonl": "json",
+    ".json": "json",
+    ".parquet": "parquet",
+}
+
+
+def detect_builder(data_files):
+    files = [data_files] if isinstance(data_files, str) else list(data_files)
+    found = set()
+    for path in files:
+        suffix = next((s for s in builders if path.endswith(s)), None)
+        if suffix is None:
+            raise ValueError(f"不支持的数据文件格式: {path}，可选 {sorted(builders)}")
+        found.add(builders[suffix])
+    if len(found) != 1:
+        raise ValueError(f"同一批数据文件的格式必须一致: {files}")
+    return found.pop()
+
+
+def split_bucket(text, seed=42):
+    """根据文本内容得到 [0, 1) 之间的确定性数值，用于划分训练/验证集（与读取顺序、分片无关）"""
+    digest = hashlib.md5(f"{seed}:{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def _encode_label(example):
+    label = example["label"]
+    try:
+        example["label"] = to_label_id(label)
+    except (TypeError, ValueError):
+        example["label"] = -1
+    return example
+
+
+def load_streaming_corpus(data_files, val_ratio=0.2, seed=42, shuffle_buffer=10000):
+    """流式读取 CSV/JSONL/Parquet 语料（text 列 + label 列），返回 train/validation 两个 IterableDataset
+
+    标签通过 label_dict 转为编号，无法识别的标签被丢弃；按文本哈希划分验证集，
+    整个过程不会把数据全部读入内存。
+    """
+    stream = load_dataset(detect_builder(data_files), data_files=data_files, split="train", streaming=True)
+    stream = stream.select_columns(["text", "label"])
+    stream = stream.filter(lambda example: example["text"] is not None and example["label"] is not None)
+    stream = stream.map(_encode_label)
+    stream = stream.filter(lambda example: 0 <= example["label"] < len(label_dict))
+
+    train = stream.filter(lambda example: split_bucket(example["text"], seed) >= val_ratio)
+    validation = stream.filter(lambda example: split_bucket(example["text"], seed) < val_ratio)
+    return IterableDatasetDict({
+        "train": train.shuffle(seed=seed, buffer_size=shuffle_buffer),
+        "validation": validation,
+    })
@@ -0,0 +1,10 @@
+# 情感标签与编号的映射，训练（Emo4.py）与各推理模块共用
+label_dict = {"快乐": 0, "愤怒": 1, "悲伤": 2}
+id2label = {str(v): k for k, v in label_dict.items()}
+
+
+def to_label_id(label):
+    """把标签名（如“快乐”）或编号（0 / "0"）统一转换为整数编号"""
+    if isinstance(label, str) and label in label_dict:
+        return label_dict[label]
+    return int(label)
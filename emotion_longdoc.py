@@ -0,0 +1,65 @@
+import numpy as np
+
+from emotion_scheduler import plan_batches, run_batches
+
+aggregations = ("mean", "max", "weighted")
+
+
+def encode_windows(texts, tokenizer, max_length=128, stride=32):
+    """把每篇文本切成有重叠的窗口（相邻窗口重叠 stride 个 token），一次编码全部文本"""
+    encoded = tokenizer(
+        list(texts),
+        truncation=True,
+        max_length=max_length,
+        stride=stride,
+        return_overflowing_tokens=True
+    )
+    doc_ids = np.asarray(encoded["overflow_to_sample_mapping"], dtype=np.int64)
+    keys = [key for key in encoded.keys() if key != "overflow_to_sample_mapping"]
+    windows = [{key: encoded[key][i] for key in keys} for i in range(len(doc_ids))]
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+    return windows, lengths, doc_ids
+
+
+def aggregate_windows(window_probs, doc_ids, lengths, num_docs, aggregation="mean"):
+    """把窗口级概率合并为文档级概率分布"""
+    num_labels = window_probs.shape[1]
+    if aggregation == "max":
+        doc_probs = np.zeros((num_docs, num_labels), dtype=np.float32)
+        np.maximum.at(doc_probs, doc_ids, window_probs)
+        return doc_probs / doc_probs.sum(axis=-1, keepdims=True)
+    if aggregation == "weighted":
+        weights = np.asarray(lengths, dtype=np.float32)
+    elif aggregation == "mean":
+        weights = np.ones(len(doc_ids), dtype=np.float32)
+    else:
+        raise ValueError(f"不支持的聚合方式: {aggregation}，可选 {aggregations}")
+    doc_probs = np.zeros((num_docs, num_labels), dtype=np.float32)
+    np.add.at(doc_probs, doc_ids, window_probs * weights[:, None])
+    totals = np.zeros(num_docs, dtype=np.float32)
+    np.add.at(totals, doc_ids, weights)
+    return doc_probs / totals[:, None]
+
+
+def predict_long_emotions(texts, tokenizer, model, max_length=128, stride=32, aggregation="mean", max_tokens=8192):
+    """长文本模式：所有文档的全部窗口一起按 token 预算批处理，再聚合为文档级概率"""
+    num_labels = model.config.num_labels
+    if len(texts) == 0:
+        return np.zeros((0, num_labels), dtype=np.float32)
+    windows, lengths, doc_ids = encode_windows(texts, tokenizer, max_length, stride)
+    batches = plan_batches(lengths, max_tokens)
+    window_probs = run_batches(windows, batches, tokenizer, model, num_labels)
+    return aggregate_windows(window_probs, doc_ids, lengths, len(texts), aggregation)
+
+
+if __name__ == "__main__":
+    from test_emotion import tokenizer, model, test_texts, format_prediction
+
+    # 把测试样例拼接成长文本，演示滑动窗口打分
+    long_texts = ["".join(test_texts) * 6, test_texts[0] * 20, test_texts[2]]
+    for aggregation in aggregations:
+        probs = predict_long_emotions(long_texts, tokenizer, model, aggregation=aggregation)
+        print(f"\n=== 长文本情感预测（聚合方式: {aggregation}）===")
+        for text, row in zip(long_texts, probs):
+            result = format_prediction(row)
+            print(f"{len(text)} 字: {result['emotion']} ({result['confidence']:.2f})")
@@ -0,0 +1,104 @@
+import json
+import os
+
+import numpy as np
+import torch
+from peft import LoraConfig, PeftConfig, PeftModel, TaskType, get_peft_model
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from emotion_labels import id2label as default_id2label
+
+adapter_root = "./emotion_adapters"
+
+
+def apply_lora(model, r=8, alpha=16, dropout=0.1, target_modules=("query", "value")):
+    """冻结基础模型，只在注意力的 query/value 上训练低秩适配器（分类头一并训练并保存）"""
+    config = LoraConfig(
+        task_type=TaskType.SEQ_CLS,
+        r=r,
+        lora_alpha=alpha,
+        lora_dropout=dropout,
+        target_modules=list(target_modules)
+    )
+    model = get_peft_model(model, config)
+    model.print_trainable_parameters()
+    return model
+
+
+def save_adapter(model, output_dir, id2label=None):
+    """只保存适配器权重、分类头和标签映射（几 MB），不保存完整模型"""
+    model.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "label_map.json"), "w", encoding="utf-8") as f:
+        json.dump(id2label or default_id2label, f, ensure_ascii=False, indent=2)
+    size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+    print(f"适配器已保存到: {output_dir}（{size / 1024 / 1024:.1f} MB）")
+
+
+def read_label_map(adapter_dir):
+    try:
+        with open(os.path.join(adapter_dir, "label_map.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return default_id2label
+
+
+def merge_adapter(adapter_dir, output_dir, base_model=None):
+    """把适配器合并进基础模型，导出一个普通的完整模型（推理时没有额外开销）"""
+    base_model = base_model or PeftConfig.from_pretrained(adapter_dir).base_model_name_or_path
+    id2label = read_label_map(adapter_dir)
+    base = AutoModelForSequenceClassification.from_pretrained(base_model, num_labels=len(id2label))
+    merged = PeftModel.from_pretrained(base, adapter_dir).merge_and_unload()
+    merged.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(base_model).save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "label_map.json"), "w", encoding="utf-8") as f:
+        json.dump(id2label, f, ensure_ascii=False, indent=2)
+    return output_dir
+
+
+class AdapterSwitcher:
+    """基础模型只加载一次，多个适配器按名称加载并在请求之间切换"""
+
+    def __init__(self, base_model="hfl/chinese-bert-wwm-ext", num_labels=3):
+        self.tokenizer = AutoTokenizer.from_pretrained(base_model)
+        self.base = AutoModelForSequenceClassification.from_pretrained(base_model, num_labels=num_labels)
+        self.model = None
+        self.labels = {}
+        self.active = None
+
+    def load_adapter(self, name, adapter_dir):
+        if self.model is None:
+            self.model = PeftModel.from_pretrained(self.base, adapter_dir, adapter_name=name)
+        else:
+            self.model.load_adapter(adapter_dir, adapter_name=name)
+        self.model.eval()
+        self.labels[name] = read_label_map(adapter_dir)
+        if self.active is None:
+            # PeftModel.from_pretrained 会激活第一个适配器，之后加载的适配器需要 use() 切换
+            self.active = name
+
+    def load_all(self, root=adapter_root):
+        """加载 root 下的全部适配器（每个子目录一个）"""
+        for name in sorted(os.listdir(root)):
+            if os.path.exists(os.path.join(root, name, "adapter_config.json")):
+                self.load_adapter(name, os.path.join(root, name))
+
+    def use(self, name):
+        """切换当前适配器（只切换指针，不重新加载权重）"""
+        if name != self.active:
+            self.model.set_adapter(name)
+            self.active = name
+
+    def predict_emotions(self, texts, adapter, batch_size=32, max_length=128):
+        """用指定适配器批量预测，返回概率数组"""
+        self.use(adapter)
+        texts = list(texts)
+        all_probs = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(texts[start:start + batch_size], return_tensors="pt", padding="longest",
+                                    truncation=True, max_length=max_length)
+            with torch.no_grad():
+                logits = self.model(**inputs).logits
+            all_probs.append(torch.nn.functional.softmax(logits, dim=-1).numpy())
+        if not all_probs:
+            return np.zeros((0, len(self.labels[adapter])), dtype=np.float32)
+        return np.concatenate(all_probs, axis=0)
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+model_path = "./emotion_model"
+onnx_path = f"{model_path}/model.onnx"
+
+
+def export_onnx(model_dir=model_path, output_path=onnx_path, opset=14, optimize=True):
+    """将 Emo4.py 保存的模型导出为 ONNX（批大小和序列长度均为动态维度）"""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+
+    dummy = tokenizer(["今天真是太开心了！", "气死我了"], return_tensors="pt", padding=True)
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            output_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    print(f"ONNX 模型已导出到: {output_path}")
+
+    if optimize:
+        # 融合注意力、LayerNorm、GELU 等算子
+        from onnxruntime.transformers import optimizer
+
+        optimized = optimizer.optimize_model(
+            output_path,
+            model_type="bert",
+            num_heads=model.config.num_attention_heads,
+            hidden_size=model.config.hidden_size,
+        )
+        optimized.save_model_to_file(output_path)
+        print(f"已完成图优化与注意力融合: {optimized.get_fused_operator_statistics()}")
+    return output_path
+
+
+class OnnxEmotionClassifier:
+    """基于 onnxruntime 的 CPU 推理后端，输出格式与 test_emotion.predict_emotion 一致"""
+
+    def __init__(self, model_dir=model_path, model_file=None, num_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        try:
+            with open(f"{model_dir}/label_map.json", "r", encoding="utf-8") as f:
+                self.id2label = json.load(f)
+        except (OSError, ValueError):
+            self.id2label = {"0": "快乐", "1": "愤怒", "2": "悲伤"}
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_file or f"{model_dir}/model.onnx",
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def predict_emotions(self, texts, batch_size=32, max_length=128):
+        """批量预测情感，返回形状为 (len(texts), 标签数) 的概率数组"""
+        texts = list(texts)
+        all_probs = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            inputs = self.tokenizer(batch, return_tensors="np", padding="longest", truncation=True, max_length=max_length)
+            feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+            logits = self.session.run(["logits"], feed)[0]
+            # 数值稳定的 softmax
+            logits = logits - logits.max(axis=-1, keepdims=True)
+            exp = np.exp(logits)
+            all_probs.append((exp / exp.sum(axis=-1, keepdims=True)).astype(np.float32))
+        if not all_probs:
+            return np.zeros((0, len(self.id2label)), dtype=np.float32)
+        return np.concatenate(all_probs, axis=0)
+
+    def format_prediction(self, probs):
+        """将单条文本的概率向量转换为结果字典"""
+        probs = np.asarray(probs).tolist()
+        predicted_label = int(np.argmax(probs))
+        return {
+            "emotion": self.id2label[str(predicted_label)],
+            "confidence": probs[predicted_label],
+            "probabilities": {self.id2label[str(i)]: p for i, p in enumerate(probs)}
+        }
+
+    def predict_emotion(self, text):
+        """预测单条文本的情感"""
+        return self.format_prediction(self.predict_emotions([text])[0])
+
+
+def check_parity(texts, model_file=None, atol=1e-4, rounds=20):
+    """对比 ONNX 后端与 PyTorch 模型的输出，并给出单条请求延迟"""
+    import test_emotion
+
+    backend = OnnxEmotionClassifier(test_emotion.model_path, model_file=model_file)
+    torch_probs = test_emotion.predict_emotions(texts)
+    onnx_probs = backend.predict_emotions(texts)
+    max_diff = float(np.abs(torch_probs - onnx_probs).max())
+    same_label = bool((torch_probs.argmax(-1) == onnx_probs.argmax(-1)).all())
+
+    latency = {}
+    # test_emotion.predict_emotion 经过预测缓存，预热后测到的只是缓存命中，这里两边都用不带缓存的推理
+    for name, predict in (("torch", test_emotion.predict_emotions), ("onnx", backend.predict_emotions)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                predict([text])
+        latency[name] = (time.perf_counter() - start) / (rounds * len(texts)) * 1000
+
+    return {
+        "max_abs_diff": max_diff,
+        "same_label": same_label,
+        "passed": same_label and max_diff <= atol,
+        "latency_ms": latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="情感模型 ONNX 导出与一致性检查")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出 ONNX 模型")
+    export_parser.add_argument("--model-dir", default=model_path)
+    export_parser.add_argument("--output", default=None)
+    export_parser.add_argument("--opset", type=int, default=14)
+    export_parser.add_argument("--no-optimize", action="store_true", help="跳过注意力融合等图优化")
+
+    parity_parser = subparsers.add_parser("parity", help="与 PyTorch 输出做一致性检查")
+    parity_parser.add_argument("--model-file", default=None)
+    parity_parser.add_argument("--atol", type=float, default=1e-4)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        output = args.output or os.path.join(args.model_dir, "model.onnx")
+        export_onnx(args.model_dir, output, opset=args.opset, optimize=not args.no_optimize)
+    else:
+        from test_emotion import test_texts
+
+        report = check_parity(test_texts, model_file=args.model_file, atol=args.atol)
+        print("\n=== ONNX 一致性检查 ===")
+        print(f"最大绝对误差: {report['max_abs_diff']:.2e}")
+        print(f"预测标签一致: {report['same_label']}")
+        print(f"单条延迟: torch {report['latency_ms']['torch']:.1f} ms, onnx {report['latency_ms']['onnx']:.1f} ms")
+        print("检查通过" if report["passed"] else "检查未通过")
+        if not report["passed"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 工作进程内的模型与分词器（每个进程只加载一次）
+_worker = {}
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _init_worker(core_queue, threads):
+    """绑定到分配的 CPU 核，固定 intra-op 线程数，然后加载一次模型"""
+    cores = core_queue.get()
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # 必须在导入 torch 之前设置，避免 OpenMP 按整机核数开线程
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    import test_emotion
+    _worker["tokenizer"] = test_emotion.tokenizer
+    _worker["model"] = test_emotion.model
+
+
+def _score_shard(texts):
+    from emotion_scheduler import predict_emotions_bucketed
+    return predict_emotions_bucketed(texts, _worker["tokenizer"], _worker["model"])
+
+
+def _num_labels():
+    return _worker["model"].config.num_labels
+
+
+class ParallelScorer:
+    """多进程分片打分：每个工作进程绑定一组核心并持有一份模型，结果按输入顺序合并"""
+
+    def __init__(self, workers=None, threads_per_worker=None, shard_size=256):
+        cores = available_cores()
+        self.workers = workers or max(len(cores) // (threads_per_worker or 4), 1)
+        self.threads = threads_per_worker or max(len(cores) // self.workers, 1)
+        self.shard_size = shard_size
+        self.num_labels = None
+
+        context = mp.get_context("spawn")
+        core_queue = context.Queue()
+        for i in range(self.workers):
+            core_queue.put(cores[i * self.threads:(i + 1) * self.threads])
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(core_queue, self.threads)
+        )
+
+    def predict_emotions(self, texts):
+        """返回形状为 (len(texts), 标签数) 的概率数组，顺序与输入一致"""
+        texts = list(texts)
+        shards = [texts[start:start + self.shard_size] for start in range(0, len(texts), self.shard_size)]
+        results = list(self.pool.map(_score_shard, shards))
+        if not results:
+            # 空输入也返回正确的列数，调用方可以照常按列取值或拼接
+            if self.num_labels is None:
+                self.num_labels = self.pool.submit(_num_labels).result()
+            return np.zeros((0, self.num_labels), dtype=np.float32)
+        return np.concatenate(results, axis=0)
+
+    def warmup(self):
+        """让每个工作进程完成模型加载"""
+        list(self.pool.map(_score_shard, [["预热"]] * self.workers))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def candidate_layouts(num_cores):
+    """枚举 工作进程数 × 每进程线程数 不超过核数的组合"""
+    layouts = []
+    threads = 1
+    while threads <= num_cores:
+        layouts.append((num_cores // threads, threads))
+        threads *= 2
+    return layouts
+
+
+def sweep(texts, layouts=None, shard_size=256):
+    """逐个尝试进程/线程布局，返回各布局的吞吐量（条/秒）"""
+    layouts = layouts or candidate_layouts(len(available_cores()))
+    results = []
+    for workers, threads in layouts:
+        with ParallelScorer(workers, threads, shard_size=shard_size) as scorer:
+            scorer.warmup()
+            start = time.perf_counter()
+            scorer.predict_emotions(texts)
+            elapsed = time.perf_counter() - start
+        results.append({"workers": workers, "threads": threads, "texts_per_sec": len(texts) / elapsed})
+        print(f"{workers:>3} 进程 × {threads:>2} 线程: {len(texts) / elapsed:.1f} 条/秒")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程分片打分：寻找最佳 进程数 × 线程数 布局")
+    parser.add_argument("--num-texts", type=int, default=4000)
+    parser.add_argument("--shard-size", type=int, default=256)
+    args = parser.parse_args()
+
+    from emotion_scheduler import make_benchmark_texts
+
+    texts = make_benchmark_texts(args.num_texts)
+    print(f"=== 布局扫描（{len(available_cores())} 核，{len(texts)} 条文本）===")
+    results = sweep(texts, shard_size=args.shard_size)
+    best = max(results, key=lambda item: item["texts_per_sec"])
+    print(f"\n最佳布局: {best['workers']} 进程 × {best['threads']} 线程（{best['texts_per_sec']:.1f} 条/秒）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification
+
+quantized_weights_name = "quantized_int8.pt"
+
+
+def quantize_dynamic_int8(model):
+    """对所有 Linear 层做 INT8 动态量化（权重 INT8，激活在运行时量化）"""
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def int8_model_path(model_dir):
+    """INT8 模型与 fp32 模型并排保存，例如 ./emotion_model -> ./emotion_model_int8"""
+    return f"{model_dir.rstrip('/')}_int8"
+
+
+def save_quantized(model, tokenizer, model_dir, output_dir=None):
+    """保存量化模型：配置、分词器、标签映射以及量化后的权重"""
+    output_dir = output_dir or int8_model_path(model_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    label_map_file = f"{model_dir}/label_map.json"
+    if os.path.exists(label_map_file):
+        shutil.copy(label_map_file, f"{output_dir}/label_map.json")
+    torch.save(model.state_dict(), f"{output_dir}/{quantized_weights_name}")
+    return output_dir
+
+
+def load_quantized(output_dir):
+    """按配置重建模型结构，量化后再加载 INT8 权重"""
+    config = AutoConfig.from_pretrained(output_dir)
+    model = AutoModelForSequenceClassification.from_config(config)
+    model = quantize_dynamic_int8(model)
+    model.load_state_dict(torch.load(f"{output_dir}/{quantized_weights_name}"))
+    model.eval()
+    return model
+
+
+def model_size_mb(model):
+    """模型权重序列化后的大小（MB）"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 / 1024
+
+
+def evaluate_variant(model, tokenizer, texts, labels, batch_size=32, max_length=128):
+    """在验证集上计算准确率和单条平均延迟"""
+    preds = []
+    for start in range(0, len(texts), batch_size):
+        inputs = tokenizer(texts[start:start + batch_size], return_tensors="pt", padding="longest",
+                           truncation=True, max_length=max_length)
+        with torch.no_grad():
+            preds.append(model(**inputs).logits.argmax(-1).numpy())
+    accuracy = float((np.concatenate(preds) == np.asarray(labels)).mean()) if preds else 0.0
+
+    start = time.perf_counter()
+    for text in texts:
+        inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=max_length)
+        with torch.no_grad():
+            model(**inputs)
+    latency_ms = (time.perf_counter() - start) / max(len(texts), 1) * 1000
+    return {"accuracy": accuracy, "latency_ms": latency_ms, "size_mb": model_size_mb(model)}
+
+
+def accuracy_report(variants, tokenizer, texts, labels, baseline="fp32"):
+    """对每个模型变体生成精度下降报告（相对 fp32 基线）"""
+    report = {name: evaluate_variant(model, tokenizer, texts, labels) for name, model in variants.items()}
+    base = report[baseline]
+    for stats in report.values():
+        stats["accuracy_drop"] = base["accuracy"] - stats["accuracy"]
+        stats["speedup"] = base["latency_ms"] / stats["latency_ms"] if stats["latency_ms"] else 0.0
+        stats["size_ratio"] = base["size_mb"] / stats["size_mb"] if stats["size_mb"] else 0.0
+    return report
+
+
+def print_report(report):
+    print("\n=== 模型变体精度报告（验证集）===")
+    for name, stats in report.items():
+        print(f"{name:>5}: 准确率 {stats['accuracy']:.4f} (下降 {stats['accuracy_drop']:+.4f}), "
+              f"单条延迟 {stats['latency_ms']:.1f} ms (加速 {stats['speedup']:.2f}x), "
+              f"大小 {stats['size_mb']:.1f} MB (压缩 {stats['size_ratio']:.2f}x)")
+
+
+def quantize_and_report(model, tokenizer, model_dir, texts, labels):
+    """量化并保存 INT8 模型，再为每个变体写入精度报告"""
+    quantized = quantize_dynamic_int8(model)
+    output_dir = save_quantized(quantized, tokenizer, model_dir)
+    report = accuracy_report({"fp32": model, "int8": quantized}, tokenizer, texts, labels)
+    for directory, name in ((model_dir, "fp32"), (output_dir, "int8")):
+        with open(f"{directory}/accuracy_report.json", "w", encoding="utf-8") as f:
+            json.dump({"variant": name, **report[name], "all_variants": report}, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    return output_dir, report
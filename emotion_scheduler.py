@@ -0,0 +1,118 @@
+import time
+import numpy as np
+import torch
+
+
+def plan_batches(lengths, max_tokens=4096, max_batch_size=128):
+    """按长度排序后，在 token 预算内组建批次，返回原始下标列表的列表"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current = []
+    current_max = 0
+    for i in order:
+        # 批次的实际开销 = 批次大小 × 批次内最长长度（即填充后的长度）
+        new_max = max(current_max, lengths[i])
+        if current and (new_max * (len(current) + 1) > max_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            new_max = lengths[i]
+        current.append(i)
+        current_max = new_max
+    if current:
+        batches.append(current)
+    return batches
+
+
+def naive_batches(n, batch_size=32):
+    """按原始顺序、固定条数切分批次（用于对比）"""
+    return [list(range(start, min(start + batch_size, n))) for start in range(0, n, batch_size)]
+
+
+def padding_waste(lengths, batches):
+    """计算填充 token 占全部计算 token 的比例"""
+    total = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches)
+    real = sum(lengths)
+    return (total - real) / total if total else 0.0
+
+
+def run_batches(encodings, batches, tokenizer, model, num_labels):
+    """按给定批次执行前向计算，并把概率写回原始顺序"""
+    probs = np.zeros((len(encodings), num_labels), dtype=np.float32)
+    for batch in batches:
+        features = [encodings[i] for i in batch]
+        inputs = tokenizer.pad(features, padding="longest", return_tensors="pt")
+        with torch.no_grad():
+            logits = model(**inputs).logits
+        probs[batch] = torch.nn.functional.softmax(logits, dim=-1).numpy()
+    return probs
+
+
+def encode_texts(texts, tokenizer, max_length=128):
+    """一次性编码全部文本（不填充），返回逐条编码及其 token 长度"""
+    encoded = tokenizer(list(texts), truncation=True, max_length=max_length)
+    encodings = [
+        {key: encoded[key][i] for key in encoded.keys()}
+        for i in range(len(texts))
+    ]
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+    return encodings, lengths
+
+
+def predict_emotions_bucketed(texts, tokenizer, model, max_tokens=4096, max_batch_size=128, max_length=128):
+    """长度分桶 + token 预算批处理，结果按输入顺序返回"""
+    num_labels = model.config.num_labels
+    if len(texts) == 0:
+        return np.zeros((0, num_labels), dtype=np.float32)
+    encodings, lengths = encode_texts(texts, tokenizer, max_length)
+    batches = plan_batches(lengths, max_tokens, max_batch_size)
+    return run_batches(encodings, batches, tokenizer, model, num_labels)
+
+
+def benchmark(texts, tokenizer, model, batch_size=32, max_tokens=4096, max_length=128):
+    """对比朴素批处理与长度分桶批处理的填充浪费和吞吐量"""
+    num_labels = model.config.num_labels
+    encodings, lengths = encode_texts(texts, tokenizer, max_length)
+    plans = {
+        "naive": naive_batches(len(texts), batch_size),
+        "bucketed": plan_batches(lengths, max_tokens, max_batch_size=max(batch_size, 128)),
+    }
+    report = {}
+    outputs = {}
+    for name, batches in plans.items():
+        start = time.perf_counter()
+        outputs[name] = run_batches(encodings, batches, tokenizer, model, num_labels)
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            "batches": len(batches),
+            "padding_waste": padding_waste(lengths, batches),
+            "texts_per_sec": len(texts) / elapsed if elapsed else float("inf"),
+        }
+    report["max_abs_diff"] = float(np.abs(outputs["naive"] - outputs["bucketed"]).max())
+    return report
+
+
+def make_benchmark_texts(n=2000, seed=42, data_path="emotion_data.csv"):
+    """用 emotion_data.csv 中的句子拼接出长度在 5 到 500 多字之间的文本"""
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    corpus = "".join(pd.read_csv(data_path)["text"].dropna())
+    texts = []
+    for _ in range(n):
+        length = int(rng.integers(5, 520))
+        start = int(rng.integers(0, len(corpus)))
+        texts.append((corpus[start:] + corpus * (length // len(corpus) + 1))[:length])
+    return texts
+
+
+if __name__ == "__main__":
+    from test_emotion import tokenizer, model
+
+    texts = make_benchmark_texts()
+    report = benchmark(texts, tokenizer, model, max_tokens=8192, max_length=512)
+    print("\n=== 批处理调度基准测试 ===")
+    for name in ("naive", "bucketed"):
+        stats = report[name]
+        print(f"{name:>8}: 批次数 {stats['batches']}, "
+              f"填充浪费 {stats['padding_waste']:.1%}, "
+              f"吞吐量 {stats['texts_per_sec']:.1f} 条/秒")
+    print(f"两种方式输出的最大差异: {report['max_abs_diff']:.2e}")
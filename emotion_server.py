@@ -0,0 +1,219 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+if os.getenv("EMOTION_REGISTRY"):
+    # 从模型版本库加载，定期检查当前版本并在后台热切换（见 model_registry.py）
+    from model_registry import ModelHandle, ModelRegistry
+    model_handle = ModelHandle(
+        ModelRegistry(os.getenv("EMOTION_REGISTRY")),
+        watch_interval=float(os.getenv("EMOTION_REGISTRY_POLL", "10")),
+        cache_size=int(os.getenv("EMOTION_CACHE_SIZE", "10000")),
+        cache_ttl=float(os.getenv("EMOTION_CACHE_TTL")) if os.getenv("EMOTION_CACHE_TTL") else None,
+        cache_path=os.getenv("EMOTION_CACHE_PATH"),
+        shadow_rate=float(os.getenv("EMOTION_SHADOW_RATE", "0.1"))
+    )
+    # 每行结果带着打分版本的标签映射，批次打分后即使发生热切换也按原版本的标签格式化
+    predict_emotions_cached = model_handle.predict_emotions_labeled
+
+    def format_prediction(result):
+        probs, id2label = result
+        return model_handle.format_prediction(probs, id2label)
+else:
+    model_handle = None
+    # 导入时加载唯一一份常驻模型（./emotion_model）
+    from test_emotion import predict_emotions_cached, format_prediction, prediction_cache
+
+
+def current_cache():
+    return model_handle.active.cache if model_handle is not None else prediction_cache
+
+
+class MicroBatcher:
+    """收集并发请求组成微批次：批次满或等待超时即执行一次前向计算"""
+
+    def __init__(self, predict_fn: Callable, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: asyncio.Queue = None
+        self._task = None
+        # 单线程执行器：模型只有一份，推理串行进行，不阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.stats = {"requests": 0, "batches": 0}
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, text: str):
+        """提交单条文本，返回该文本的概率向量"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def _collect(self) -> List:
+        # 阻塞等待第一条请求，然后在等待窗口内尽量凑满批次
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                probs = await loop.run_in_executor(self._executor, self.predict_fn, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            for (_, future), row in zip(batch, probs):
+                # 调用方可能已经取消（如客户端断开）
+                if not future.done():
+                    future.set_result(row)
+
+
+class PredictRequest(BaseModel):
+    text: str
+
+
+class PredictBatchRequest(BaseModel):
+    texts: List[str]
+
+
+class ShadowRequest(BaseModel):
+    version: str
+
+
+app = FastAPI()
+batcher: MicroBatcher = None
+
+
+@app.on_event("startup")
+async def startup():
+    """启动批处理循环"""
+    global batcher
+    batcher = MicroBatcher(
+        predict_emotions_cached,
+        max_batch_size=int(os.getenv("EMOTION_MAX_BATCH_SIZE", "32")),
+        max_wait_ms=float(os.getenv("EMOTION_MAX_WAIT_MS", "5")),
+    )
+    await batcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if batcher is not None:
+        await batcher.stop()
+
+
+@app.post("/predict")
+async def predict(request: PredictRequest):
+    """预测单条文本的情感"""
+    try:
+        probs = await batcher.submit(request.text)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return format_prediction(probs)
+
+
+@app.post("/predict/batch")
+async def predict_batch(request: PredictBatchRequest):
+    """预测多条文本的情感，各条文本与其他请求一起参与微批次"""
+    try:
+        rows = await asyncio.gather(*(batcher.submit(text) for text in request.texts))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return [format_prediction(probs) for probs in rows]
+
+
+@app.get("/stats")
+async def stats():
+    """返回已处理的请求数、批次数和平均批大小"""
+    requests = batcher.stats["requests"]
+    batches = batcher.stats["batches"]
+    return {
+        "requests": requests,
+        "batches": batches,
+        "avg_batch_size": requests / batches if batches else 0.0,
+        "queue_size": batcher.queue.qsize(),
+        "cache": current_cache().stats(),
+        "model": model_handle.status() if model_handle is not None else None,
+    }
+
+
+
+def require_registry():
+    if model_handle is None:
+        raise HTTPException(status_code=404, detail="未启用模型版本库（设置 EMOTION_REGISTRY）")
+    return model_handle
+
+
+@app.get("/model")
+async def model_status():
+    """当前版本、正在加载的版本、影子对比结果和最近的切换记录"""
+    return require_registry().status()
+
+
+@app.post("/model/shadow")
+async def start_shadow(request: ShadowRequest):
+    """把版本设为影子版本：写入版本库的 SHADOW（其他服务进程在下次检查时跟随），本进程立即加载"""
+    handle = require_registry()
+    try:
+        handle.registry.set_shadow(request.version)
+        await asyncio.get_running_loop().run_in_executor(None, handle.sync_shadow, request.version)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return handle.status()
+
+
+@app.delete("/model/shadow")
+async def stop_shadow():
+    handle = require_registry()
+    handle.registry.clear_shadow()
+    handle.stop_shadow()
+    return handle.status()
+
+
+@app.post("/model/shadow/promote")
+async def promote_shadow():
+    """影子版本转为当前版本（更新版本库的 CURRENT，其他服务进程随后热切换）"""
+    handle = require_registry()
+    try:
+        handle.promote_shadow()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return handle.status()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("EMOTION_HOST", "0.0.0.0"), port=int(os.getenv("EMOTION_PORT", "8000")))
@@ -0,0 +1,140 @@
+import json
+import os
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from emotion_labels import id2label as default_id2label
+from emotion_scheduler import encode_texts, plan_batches
+
+
+class MultiTenantEngine:
+    """多租户推理：内存中只保留一份基础编码器，不同租户的请求一起过编码器，再逐行应用各自的分类头或 LoRA 适配器
+
+    - 分类头租户：emotion_head.py 保存的 head.pt（可以有自己的标签集），只增加一个线性层的内存
+    - 适配器租户：emotion_lora.py 保存的 LoRA 适配器，混合批次中每行按租户选择适配器
+    所有分类头和适配器都必须基于同一个 base_model 训练；适配器租户的标签数与基础模型相同。
+    predict() 的输入是 (租户, 文本) 列表，可以直接作为 emotion_server.MicroBatcher 的 predict_fn。
+    """
+
+    def __init__(self, base_model="./emotion_model"):
+        self.tokenizer = AutoTokenizer.from_pretrained(base_model)
+        self.hf_model = AutoModelForSequenceClassification.from_pretrained(base_model)
+        self.hf_model.eval()
+        self.peft = None
+        self.tenants = {}
+        # 基础模型自带的分类头作为默认租户
+        try:
+            with open(os.path.join(base_model, "label_map.json"), "r", encoding="utf-8") as f:
+                labels = json.load(f)
+        except OSError:
+            labels = default_id2label
+        self.tenants["default"] = {"kind": "head", "head": self.hf_model.classifier, "pooling": "pooler", "labels": labels}
+
+    def add_head(self, tenant, head_dir):
+        """注册分类头租户（head_dir 下的 head.pt 需基于同一个编码器训练）"""
+        saved = torch.load(os.path.join(head_dir, "head.pt"))
+        weight = saved["state_dict"]["weight"]
+        head = torch.nn.Linear(weight.shape[1], weight.shape[0])
+        head.load_state_dict(saved["state_dict"])
+        head.eval()
+        self.tenants[tenant] = {"kind": "head", "head": head, "pooling": saved["pooling"], "labels": saved["id2label"]}
+
+    def add_adapter(self, tenant, adapter_dir):
+        """注册 LoRA 适配器租户，适配器注入到共享的基础模型中"""
+        from peft import PeftModel
+        from emotion_lora import read_label_map
+
+        if self.peft is None:
+            self.peft = PeftModel.from_pretrained(self.hf_model, adapter_dir, adapter_name=tenant)
+        else:
+            self.peft.load_adapter(adapter_dir, adapter_name=tenant)
+        self.peft.eval()
+        self.tenants[tenant] = {"kind": "adapter", "labels": read_label_map(adapter_dir)}
+
+    def remove_tenant(self, tenant):
+        spec = self.tenants.pop(tenant)
+        if spec["kind"] == "adapter":
+            self.peft.delete_adapter(tenant)
+
+    def _forward(self, inputs, batch_tenants):
+        """一次编码器前向；返回各池化方式的句向量（按需计算）以及适配器行的 logits"""
+        if self.peft is None:
+            outputs = self.hf_model.base_model(**inputs)
+            hidden, pooler_output, adapter_logits = outputs.last_hidden_state, outputs.pooler_output, None
+        else:
+            # 分类头租户的行走基础模型（__base__），适配器租户的行走各自的适配器
+            adapter_names = [t if self.tenants[t]["kind"] == "adapter" else "__base__" for t in batch_tenants]
+            outputs = self.peft(**inputs, adapter_names=adapter_names, output_hidden_states=True)
+            hidden, adapter_logits = outputs.hidden_states[-1], outputs.logits
+            pooler_output = None
+
+        def pooled(pooling):
+            if pooling == "pooler":
+                return pooler_output if pooler_output is not None else self.hf_model.base_model.pooler(hidden)
+            if pooling == "cls":
+                return hidden[:, 0]
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+        return pooled, adapter_logits
+
+    def predict(self, requests, max_tokens=8192, max_length=128):
+        """requests 为 (租户, 文本) 列表，返回与输入顺序一致的概率数组列表（各租户的标签数可以不同）"""
+        requests = list(requests)
+        unknown = {tenant for tenant, _ in requests if tenant not in self.tenants}
+        if unknown:
+            raise KeyError(f"未注册的租户: {sorted(unknown)}")
+        tenants = [tenant for tenant, _ in requests]
+        encodings, lengths = encode_texts([text for _, text in requests], self.tokenizer, max_length)
+        results = [None] * len(requests)
+
+        for batch in plan_batches(lengths, max_tokens):
+            inputs = self.tokenizer.pad([encodings[i] for i in batch], padding="longest", return_tensors="pt")
+            batch_tenants = [tenants[i] for i in batch]
+            with torch.no_grad():
+                pooled, adapter_logits = self._forward(inputs, batch_tenants)
+                cache = {}
+                for tenant in set(batch_tenants):
+                    rows = [j for j, t in enumerate(batch_tenants) if t == tenant]
+                    spec = self.tenants[tenant]
+                    if spec["kind"] == "adapter":
+                        logits = adapter_logits[rows]
+                    else:
+                        if spec["pooling"] not in cache:
+                            cache[spec["pooling"]] = pooled(spec["pooling"])
+                        logits = spec["head"](cache[spec["pooling"]][rows])
+                    probs = torch.nn.functional.softmax(logits, dim=-1).numpy()
+                    for j, row in zip(rows, probs):
+                        results[batch[j]] = row
+        return results
+
+    def predict_labeled(self, requests):
+        """返回带标签名的结果字典列表"""
+        requests = list(requests)
+        results = []
+        for (tenant, _), probs in zip(requests, self.predict(requests)):
+            labels = self.tenants[tenant]["labels"]
+            probs = np.asarray(probs).tolist()
+            predicted = int(np.argmax(probs))
+            results.append({
+                "tenant": tenant,
+                "emotion": labels[str(predicted)],
+                "confidence": probs[predicted],
+                "probabilities": {labels[str(i)]: p for i, p in enumerate(probs)}
+            })
+        return results
+
+    def memory_report(self):
+        """基础模型与各租户附加参数的内存占用（MB）"""
+        def size(params):
+            return sum(p.numel() * p.element_size() for p in params) / 1024 / 1024
+
+        report = {"base_model": size(p for n, p in self.hf_model.named_parameters() if "lora_" not in n)}
+        for tenant, spec in self.tenants.items():
+            if spec["kind"] == "head":
+                report[tenant] = size(spec["head"].parameters()) if tenant != "default" else 0.0
+            else:
+                report[tenant] = size(p for n, p in self.peft.named_parameters() if f".{tenant}." in n)
+        return report
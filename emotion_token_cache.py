@@ -0,0 +1,81 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+
+from datasets import DatasetDict, load_from_disk
+
+token_cache_dir = "./tokenized_cache"
+
+
+def vocab_hash(tokenizer):
+    """分词器词表的哈希（词表或分词器类型变化都会使缓存失效）"""
+    vocab = sorted(tokenizer.get_vocab().items())
+    payload = json.dumps([type(tokenizer).__name__, vocab], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def data_hash(dataset, batch_size=10000):
+    """按内容计算数据集哈希（逐批读取，不会一次性载入内存）"""
+    digest = hashlib.sha256()
+    splits = dataset.items() if isinstance(dataset, DatasetDict) else [("", dataset)]
+    for name, split in sorted(splits, key=lambda item: item[0]):
+        digest.update(f"[{name}]".encode("utf-8"))
+        for batch in split.iter(batch_size=batch_size):
+            digest.update(json.dumps(batch, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_key(dataset, tokenize_function, tokenizer, max_length, settings=None):
+    """缓存键 = 分词器名称与词表哈希 + max_length + 增强/填充等设置 + 预处理函数源码 + 数据哈希"""
+    try:
+        function_source = inspect.getsource(tokenize_function)
+    except (OSError, TypeError):
+        function_source = getattr(tokenize_function, "__qualname__", repr(tokenize_function))
+    parts = {
+        "tokenizer": tokenizer.name_or_path,
+        "vocab": vocab_hash(tokenizer),
+        "max_length": max_length,
+        "settings": settings or {},
+        "function": hashlib.sha256(function_source.encode("utf-8")).hexdigest(),
+        "data": data_hash(dataset),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:24], parts
+
+
+def cached_tokenize(dataset, tokenize_function, tokenizer, max_length, settings=None,
+                    cache_dir=token_cache_dir, **map_kwargs):
+    """带内容寻址磁盘缓存的 dataset.map：命中时直接加载 Arrow 数据，跳过分词"""
+    start = time.perf_counter()
+    key, parts = cache_key(dataset, tokenize_function, tokenizer, max_length, settings)
+    path = os.path.join(cache_dir, key)
+    meta_path = os.path.join(path, "cache_meta.json")
+
+    if os.path.exists(meta_path):
+        tokenized = load_from_disk(path)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        elapsed = time.perf_counter() - start
+        print(f"分词缓存命中: {path}，耗时 {elapsed:.2f} 秒，"
+              f"节省约 {max(meta['tokenize_seconds'] - elapsed, 0.0):.2f} 秒")
+        return tokenized
+
+    print(f"分词缓存未命中，开始分词: {path}")
+    tokenized = dataset.map(tokenize_function, **map_kwargs)
+    tokenize_seconds = time.perf_counter() - start
+
+    # 先写入临时目录，完成后再重命名，避免中断时留下不完整的缓存
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tokenized.save_to_disk(tmp_path)
+    with open(os.path.join(tmp_path, "cache_meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"key": key, "tokenize_seconds": tokenize_seconds, **parts}, f, ensure_ascii=False, indent=2)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # 其他进程已经写入了同一份缓存
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    print(f"分词完成，耗时 {tokenize_seconds:.2f} 秒，已写入缓存")
+    return load_from_disk(path)
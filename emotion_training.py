@@ -1,6 +1,8 @@
 import json
-import os
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from model_store import ModelStore
+
+fallback_model_name = "bert-base-multilingual-cased"
 
 # 1. 添加错误处理
 try:
@@ -9,38 +11,26 @@ try:
 except FileNotFoundError:
     config = {
         'huggingface_token': None,  # 如果没有token可以设为None
-        'model_name': "bert-base-multilingual-cased",  # 使用备选模型
+        'model_name': fallback_model_name,  # 使用备选模型
         'model_save_path': "./emotion_model"
     }
 
-# 2. 优化模型加载
-try:
-    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-    model = AutoModelForSequenceClassification.from_pretrained(
-        model_name,
-        num_labels=3,
-        trust_remote_code=True
-    )
-except Exception as e:
-    print(f"Error loading primary model: {e}")
-    print("Falling back to multilingual model...")
-    model_name = "bert-base-multilingual-cased"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(
-        model_name, 
-        num_labels=3
-    )
 
-# 3. 添加离线模型加载支持
-def load_model_with_fallback(model_name):
-    try:
-        # 先尝试从本地加载
-        if os.path.exists(f"./cached_models/{model_name}"):
-            return AutoTokenizer.from_pretrained(f"./cached_models/{model_name}"), \
-                   AutoModelForSequenceClassification.from_pretrained(f"./cached_models/{model_name}")
-        # 如果本地没有，则从线上下载
-        return AutoTokenizer.from_pretrained(model_name), \
-               AutoModelForSequenceClassification.from_pretrained(model_name)
-    except Exception as e:
-        print(f"Error loading model {model_name}: {e}")
-        return None, None 
\ No newline at end of file
+# 2. 离线模型加载支持：模型统一从按内容哈希寻址的本地仓库加载（见 model_store.py），
+#    本地没有时才下载一次；设置 EMOTION_OFFLINE=1 或 HF_HUB_OFFLINE=1 后完全不访问网络
+def load_model_with_fallback(model_name, num_labels=3, fallback=fallback_model_name, store=None):
+    store = store or ModelStore()
+    for name in dict.fromkeys([model_name, fallback]):
+        try:
+            tokenizer, model, _ = store.load(name, num_labels=num_labels)
+            return tokenizer, model
+        except Exception as e:
+            print(f"Error loading model {name}: {e}")
+            if name != fallback:
+                print("Falling back to multilingual model...")
+    return None, None
+
+
+if __name__ == "__main__":
+    # 3. 只加载一次：主模型失败时才加载备选模型
+    tokenizer, model = load_model_with_fallback(config.get('model_name', fallback_model_name))
@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import torch
+
+bundle_path = "./emotion_model.bundle"
+
+# safetensors 头部中的数据类型名 -> torch 数据类型
+safetensors_dtypes = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+# 分词器 init_kwargs 中与本地文件相关、打包后不再有意义的项
+tokenizer_init_skip = {"vocab_file", "merges_file", "tokenizer_file", "name_or_path", "tokenizer_object",
+                       "special_tokens_map_file", "added_tokens_decoder"}
+
+
+def _sha256(data):
+    return hashlib.sha256(data.encode("utf-8") if isinstance(data, str) else data).hexdigest()
+
+
+def _read_header(mm):
+    """safetensors 格式：8 字节小端头部长度 + JSON 头部 + 连续存放的张量数据"""
+    (header_size,) = struct.unpack("<Q", mm[:8])
+    header = json.loads(bytes(mm[8:8 + header_size]).decode("utf-8"))
+    return header, 8 + header_size
+
+
+def write_bundle(model_dir, output_path=bundle_path):
+    """把模型权重、分词器、配置和标签映射打包成一个 safetensors 文件
+
+    非权重内容放在 safetensors 的 __metadata__ 中，manifest 记录权重数据和各项内容的 sha256。
+    """
+    from safetensors.torch import save_file
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    label_map_file = os.path.join(model_dir, "label_map.json")
+    if not os.path.exists(label_map_file):
+        raise FileNotFoundError(f"{label_map_file} 不存在，打包需要明确的标签映射")
+    with open(label_map_file, "r", encoding="utf-8") as f:
+        id2label = json.load(f)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    if not tokenizer.is_fast:
+        raise ValueError("打包只支持 fast 分词器（需要 tokenizer.json）")
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+
+    tokenizer_config = {key: value for key, value in tokenizer.special_tokens_map.items() if isinstance(value, str)}
+    # do_lower_case、strip_accents、tokenize_chinese_chars 等也要保存，否则重建分词器时会用类的默认值改写归一化器
+    for key, value in tokenizer.init_kwargs.items():
+        if key in tokenizer_init_skip or key in tokenizer_config:
+            continue
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        tokenizer_config[key] = value
+    tokenizer_config.update(model_max_length=tokenizer.model_max_length, padding_side=tokenizer.padding_side)
+    metadata = {
+        "config": model.config.to_json_string(use_diff=False),
+        "tokenizer": tokenizer.backend_tokenizer.to_str(),
+        "tokenizer_class": type(tokenizer).__name__,
+        "tokenizer_config": json.dumps(tokenizer_config, ensure_ascii=False),
+        "label_map": json.dumps(id2label, ensure_ascii=False),
+    }
+    state_dict = {name: tensor.contiguous() for name, tensor in model.state_dict().items()}
+    digest = hashlib.sha256()
+    for name in sorted(state_dict):
+        digest.update(name.encode("utf-8"))
+        digest.update(state_dict[name].numpy().tobytes())
+    metadata["manifest"] = json.dumps({
+        "source": os.path.abspath(model_dir),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "tensors_sha256": digest.hexdigest(),
+        "metadata_sha256": {key: _sha256(value) for key, value in metadata.items()},
+    }, ensure_ascii=False)
+
+    tmp_path = f"{output_path}.tmp{os.getpid()}"
+    save_file(state_dict, tmp_path, metadata=metadata)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def _map_tensors(path):
+    """把权重内存映射为张量：MAP_PRIVATE 映射，只读使用时各进程共享页缓存，不复制到堆内存"""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header, data_start = _read_header(mm)
+    metadata = header.pop("__metadata__", {})
+    tensors = {}
+    for name, info in header.items():
+        begin, end = info["data_offsets"]
+        dtype = safetensors_dtypes[info["dtype"]]
+        if end == begin:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        tensors[name] = torch.frombuffer(mm, dtype=dtype, count=(end - begin) // dtype.itemsize,
+                                         offset=data_start + begin).view(info["shape"])
+    return tensors, metadata
+
+
+def verify_bundle(path):
+    """重新计算 manifest 中的校验和，返回不一致的项目列表"""
+    tensors, metadata = _map_tensors(path)
+    manifest = json.loads(metadata["manifest"])
+    problems = [key for key, expected in manifest["metadata_sha256"].items()
+                if _sha256(metadata.get(key, "")) != expected]
+    digest = hashlib.sha256()
+    for name in sorted(tensors):
+        digest.update(name.encode("utf-8"))
+        digest.update(tensors[name].numpy().tobytes())
+    if digest.hexdigest() != manifest["tensors_sha256"]:
+        problems.append("tensors")
+    return problems
+
+
+def load_bundle(path=bundle_path, verify=False):
+    """从单文件模型包加载，返回 (tokenizer, model, id2label, manifest)
+
+    模型先在 meta 设备上构建（不分配权重内存），再直接把内存映射的张量挂到参数上。
+    """
+    import transformers
+    from accelerate import init_empty_weights
+    from tokenizers import Tokenizer
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    if verify:
+        problems = verify_bundle(path)
+        if problems:
+            raise ValueError(f"模型包 {path} 校验失败: {problems}")
+    tensors, metadata = _map_tensors(path)
+
+    config_dict = json.loads(metadata["config"])
+    config = AutoConfig.for_model(config_dict.pop("model_type"), **config_dict)
+    with init_empty_weights():
+        model = AutoModelForSequenceClassification.from_config(config)
+    model.load_state_dict(tensors, assign=True)
+    model.eval()
+
+    tokenizer_class = getattr(transformers, metadata["tokenizer_class"], transformers.PreTrainedTokenizerFast)
+    tokenizer = tokenizer_class(tokenizer_object=Tokenizer.from_str(metadata["tokenizer"]),
+                                **json.loads(metadata["tokenizer_config"]))
+    return tokenizer, model, json.loads(metadata["label_map"]), json.loads(metadata["manifest"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把模型打包成单个可内存映射的 safetensors 文件")
+    parser.add_argument("command", choices=["pack", "verify", "load"])
+    parser.add_argument("--model", default="./emotion_model")
+    parser.add_argument("--bundle", default=bundle_path)
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        write_bundle(args.model, args.bundle)
+        print(f"模型包已写入: {args.bundle}（{os.path.getsize(args.bundle) / 1024 / 1024:.1f} MB）")
+    elif args.command == "verify":
+        problems = verify_bundle(args.bundle)
+        print("校验通过" if not problems else f"校验失败: {problems}")
+    else:
+        start = time.perf_counter()
+        tokenizer, model, id2label, _ = load_bundle(args.bundle)
+        elapsed = time.perf_counter() - start
+        print(f"加载耗时: {elapsed * 1000:.1f} ms，标签: {id2label}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from emotion_cache import PredictionCache
+from emotion_labels import id2label as default_id2label
+from emotion_scheduler import predict_emotions_bucketed
+from model_store import file_manifest, manifest_hash
+
+registry_root = os.getenv("EMOTION_REGISTRY", "./model_registry")
+# 新版本切换前先用这些文本跑一遍，完成首批推理的惰性初始化
+warmup_texts = ["今天真是太开心了！", "这件事让我非常生气", "听到这个消息我很难过", "好"]
+
+
+def _atomic_write(path, content):
+    tmp_path = f"{path}.tmp{uuid.uuid4().hex}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """本地模型版本库：versions/<版本>/ 存放完整模型目录，CURRENT 文件指向当前版本，
+    SHADOW 文件（可选）指向正在做影子对比的候选版本"""
+
+    def __init__(self, root=registry_root):
+        self.root = root
+        os.makedirs(os.path.join(root, "versions"), exist_ok=True)
+
+    def path(self, version):
+        return os.path.join(self.root, "versions", version)
+
+    def versions(self):
+        return sorted(name for name in os.listdir(os.path.join(self.root, "versions"))
+                      if os.path.exists(os.path.join(self.path(name), "version.json")))
+
+    def _read_pointer(self, name):
+        try:
+            with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def current(self):
+        return self._read_pointer("CURRENT")
+
+    def shadow(self):
+        return self._read_pointer("SHADOW")
+
+    def info(self, version):
+        with open(os.path.join(self.path(version), "version.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def publish(self, model_dir, activate=True, shadow=False):
+        """复制模型目录作为新版本（内容相同则复用已有版本）
+
+        activate=True 时同时设为当前版本；shadow=True 时设为影子版本，服务按抽样比例与当前版本对比。
+        """
+        manifest = file_manifest(model_dir)
+        digest = manifest_hash(manifest)
+        existing = [version for version in self.versions() if self.info(version)["manifest_hash"] == digest]
+        if existing:
+            version = existing[-1]
+        else:
+            version = time.strftime("v%Y%m%d-%H%M%S-") + digest[:8]
+            staged = f"{self.path(version)}.tmp{uuid.uuid4().hex}"
+            shutil.copytree(model_dir, staged)
+            with open(os.path.join(staged, "version.json"), "w", encoding="utf-8") as f:
+                json.dump({"version": version, "source": os.path.abspath(model_dir),
+                           "published": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           "manifest_hash": digest, "files": manifest}, f, ensure_ascii=False, indent=2)
+            # 目录改名是原子的，读取方不会看到复制了一半的版本
+            os.rename(staged, self.path(version))
+        if activate:
+            self.activate(version)
+        elif shadow:
+            self.set_shadow(version)
+        return version
+
+    def activate(self, version):
+        """切换当前版本（也用于回滚）"""
+        if version not in self.versions():
+            raise KeyError(f"模型版本不存在: {version}")
+        _atomic_write(os.path.join(self.root, "CURRENT"), version)
+        if self.shadow() == version:
+            self.clear_shadow()
+
+    def set_shadow(self, version):
+        if version not in self.versions():
+            raise KeyError(f"模型版本不存在: {version}")
+        _atomic_write(os.path.join(self.root, "SHADOW"), version)
+
+    def clear_shadow(self):
+        try:
+            os.remove(os.path.join(self.root, "SHADOW"))
+        except FileNotFoundError:
+            pass
+
+    def remove(self, version):
+        if version == self.current():
+            raise ValueError(f"不能删除当前版本: {version}")
+        shutil.rmtree(self.path(version))
+
+
+class LoadedModel:
+    """一个已加载并预热的模型版本；每个版本使用独立的预测缓存，切换后旧结果不会被误用"""
+
+    def __init__(self, version, path, cache_size=10000, cache_ttl=None, cache_path=None):
+        self.version = version
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.model = AutoModelForSequenceClassification.from_pretrained(path)
+        self.model.eval()
+        for param in self.model.parameters():
+            param.requires_grad_(False)
+        try:
+            with open(os.path.join(path, "label_map.json"), "r", encoding="utf-8") as f:
+                self.id2label = json.load(f)
+        except OSError:
+            self.id2label = default_id2label
+        self.cache = PredictionCache(version, maxsize=cache_size, ttl=cache_ttl, disk_path=cache_path)
+
+    def predict_emotions(self, texts):
+        with torch.no_grad():
+            return predict_emotions_bucketed(list(texts), self.tokenizer, self.model)
+
+    def warmup(self, texts=warmup_texts):
+        start = time.perf_counter()
+        self.predict_emotions(texts)
+        return time.perf_counter() - start
+
+
+class ModelHandle:
+    """进程内的模型句柄：后台加载新版本、预热后原子切换，正在执行的批次继续使用旧版本
+
+    每次预测开始时取一次 self._active 的引用，整个批次都在这个对象上完成；
+    切换只是替换引用，旧版本在最后一个批次结束后由垃圾回收释放。
+    影子模式下按 sample_rate 抽样把同一批文本交给候选版本，在后台线程中比较结果，不影响响应延迟。
+    """
+
+    def __init__(self, registry=None, watch_interval=None, cache_size=10000, cache_ttl=None, cache_path=None,
+                 shadow_rate=0.1):
+        self.registry = registry or ModelRegistry()
+        self.shadow_rate = shadow_rate
+        self.cache_settings = {"cache_size": cache_size, "cache_ttl": cache_ttl, "cache_path": cache_path}
+        self._lock = threading.Lock()
+        self._loading = None
+        self._shadow = None
+        self._shadow_rate = 0.0
+        self._shadow_pending = 0
+        self._shadow_loading = None
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1)
+        self.shadow_stats = {}
+        self.swaps = []
+        version = self.registry.current()
+        if version is None:
+            raise FileNotFoundError(f"模型版本库 {self.registry.root} 中还没有当前版本，请先 publish")
+        # 第一个版本同步加载，之后的版本都在后台加载
+        self._active = self._load(version)
+        self._watcher = None
+        self._stopped = threading.Event()
+        if watch_interval:
+            self._watcher = threading.Thread(target=self._watch, args=(watch_interval,), daemon=True)
+            self._watcher.start()
+
+    @property
+    def active(self):
+        return self._active
+
+    def _load(self, version):
+        start = time.perf_counter()
+        loaded = LoadedModel(version, self.registry.path(version), **self.cache_settings)
+        warmup_seconds = loaded.warmup()
+        print(f"模型版本 {version} 加载完成：加载 {time.perf_counter() - start - warmup_seconds:.1f}s，"
+              f"预热 {warmup_seconds:.2f}s", flush=True)
+        return loaded
+
+    def load(self, version=None, background=True):
+        """加载指定版本（默认为仓库的当前版本），预热完成后切换；同一时间只加载一个版本"""
+        version = version or self.registry.current()
+        with self._lock:
+            if version == self._active.version or self._loading is not None:
+                return None
+            self._loading = version
+
+        def run():
+            try:
+                loaded = self._load(version)
+                self._swap(loaded)
+            except Exception as e:
+                print(f"加载模型版本 {version} 失败，继续使用 {self._active.version}: {e}", flush=True)
+            finally:
+                with self._lock:
+                    if self._loading == version:
+                        self._loading = None
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _swap(self, loaded):
+        with self._lock:
+            previous = self._active
+            self._active = loaded
+            self.swaps.append({"from": previous.version, "to": loaded.version, "time": time.time()})
+        print(f"模型已切换: {previous.version} -> {loaded.version}", flush=True)
+
+    def _watch(self, interval):
+        """定期检查仓库的 CURRENT 和 SHADOW：CURRENT 变化时在后台加载并切换，SHADOW 变化时开始或停止影子对比
+
+        影子版本通过版本库设置，多个服务进程会同时跟随。
+        """
+        while not self._stopped.wait(interval):
+            try:
+                version = self.registry.current()
+                shadow = self.registry.shadow()
+            except OSError:
+                continue
+            if version is not None and version != self._active.version:
+                self.load(version)
+            try:
+                self.sync_shadow(shadow)
+            except Exception as e:
+                print(f"影子版本 {shadow} 加载失败: {e}", flush=True)
+
+    def sync_shadow(self, version):
+        """让影子模型与版本库中的 SHADOW 一致（version 为 None 时停止影子对比）"""
+        with self._lock:
+            current = self._shadow.version if self._shadow is not None else None
+            # 管理接口和版本库检查线程可能同时调用，同一个影子版本只加载一次
+            if version == current or (version is not None and version == self._shadow_loading):
+                return
+            self._shadow_loading = version
+        try:
+            if version is None or version == self._active.version:
+                self.stop_shadow()
+            else:
+                self.start_shadow(version, self.shadow_rate)
+        finally:
+            with self._lock:
+                self._shadow_loading = None
+
+    def close(self):
+        self._stopped.set()
+        self._shadow_executor.shutdown(wait=True)
+
+    def predict_emotions(self, texts):
+        """批量预测（不经过缓存），返回概率数组"""
+        loaded = self._active
+        probs = loaded.predict_emotions(texts)
+        self._maybe_shadow(loaded, texts, probs)
+        return probs
+
+    def predict_emotions_cached(self, texts):
+        """带缓存的批量预测；缓存属于本批次使用的版本"""
+        loaded = self._active
+        texts = list(texts)
+        probs = loaded.cache.predict(texts, loaded.predict_emotions)
+        self._maybe_shadow(loaded, texts, probs)
+        return probs
+
+    def predict_emotions_labeled(self, texts):
+        """带缓存的批量预测，每行返回 (概率, 打分版本的标签映射)，格式化时不会用到切换后另一个版本的标签"""
+        loaded = self._active
+        texts = list(texts)
+        probs = loaded.cache.predict(texts, loaded.predict_emotions)
+        self._maybe_shadow(loaded, texts, probs)
+        return [(row, loaded.id2label) for row in probs]
+
+    def format_prediction(self, probs, id2label):
+        """id2label 必须来自产生 probs 的版本（见 predict_emotions_labeled）"""
+        probs = np.asarray(probs).tolist()
+        predicted = int(np.argmax(probs))
+        return {
+            "emotion": id2label[str(predicted)],
+            "confidence": probs[predicted],
+            "probabilities": {id2label[str(i)]: p for i, p in enumerate(probs)}
+        }
+
+    def start_shadow(self, version, sample_rate=0.1):
+        """加载候选版本作为影子模型，按 sample_rate 抽样比较"""
+        if version == self._active.version:
+            raise ValueError(f"影子版本与当前版本相同: {version}")
+        loaded = self._load(version)
+        with self._lock:
+            self._shadow = loaded
+            self._shadow_rate = sample_rate
+            self.shadow_stats = {"version": version, "samples": 0, "agree": 0, "max_abs_diff": 0.0,
+                                 "shadow_ms": 0.0, "skipped": 0}
+
+    def stop_shadow(self):
+        with self._lock:
+            self._shadow = None
+            self._shadow_rate = 0.0
+
+    def promote_shadow(self):
+        """把影子版本切换为主版本，并更新仓库的当前版本"""
+        with self._lock:
+            shadow, self._shadow, self._shadow_rate = self._shadow, None, 0.0
+        if shadow is None:
+            raise ValueError("当前没有影子模型")
+        self._swap(shadow)
+        # activate 会同时清除版本库中的 SHADOW
+        self.registry.activate(shadow.version)
+
+    def _maybe_shadow(self, primary, texts, primary_probs):
+        shadow = self._shadow
+        if shadow is None or not len(texts) or random.random() >= self._shadow_rate:
+            return
+        with self._lock:
+            # 影子推理跟不上时直接丢弃样本，不在内存中堆积
+            if self._shadow_pending >= 4:
+                self.shadow_stats["skipped"] += 1
+                return
+            self._shadow_pending += 1
+        self._shadow_executor.submit(self._compare, shadow, list(texts), np.asarray(primary_probs))
+
+    def _compare(self, shadow, texts, primary_probs):
+        try:
+            start = time.perf_counter()
+            shadow_probs = shadow.predict_emotions(texts)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self.shadow_stats
+                if stats.get("version") != shadow.version:
+                    return
+                stats["samples"] += len(texts)
+                stats["agree"] += int((primary_probs.argmax(-1) == shadow_probs.argmax(-1)).sum())
+                if primary_probs.shape == shadow_probs.shape:
+                    stats["max_abs_diff"] = max(stats["max_abs_diff"], float(np.abs(primary_probs - shadow_probs).max()))
+                stats["shadow_ms"] += elapsed * 1000
+        except Exception as e:
+            print(f"影子模型推理失败: {e}", flush=True)
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    def shadow_report(self):
+        stats = dict(self.shadow_stats)
+        if stats.get("samples"):
+            stats["agreement"] = stats["agree"] / stats["samples"]
+        return stats
+
+    def status(self):
+        return {
+            "active": self._active.version,
+            "registry_current": self.registry.current(),
+            "loading": self._loading,
+            "shadow": self.shadow_report() if self._shadow is not None else None,
+            "swaps": self.swaps[-10:],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模型版本库")
+    parser.add_argument("command", choices=["publish", "list", "activate", "shadow", "unshadow", "remove"])
+    parser.add_argument("target", nargs="?", help="publish 时为模型目录，activate/shadow/remove 时为版本号")
+    parser.add_argument("--root", default=registry_root)
+    parser.add_argument("--shadow", action="store_true", help="publish 时不切换当前版本，而是设为影子版本")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "publish":
+        version = registry.publish(args.target or "./emotion_model", activate=not args.shadow, shadow=args.shadow)
+        print(f"已发布版本: {version}")
+    elif args.command == "activate":
+        registry.activate(args.target)
+        print(f"当前版本: {args.target}")
+    elif args.command == "shadow":
+        registry.set_shadow(args.target)
+        print(f"影子版本: {args.target}")
+    elif args.command == "unshadow":
+        registry.clear_shadow()
+    elif args.command == "remove":
+        registry.remove(args.target)
+    else:
+        current, shadow = registry.current(), registry.shadow()
+        for version in registry.versions():
+            info = registry.info(version)
+            mark = "*" if version == current else "s" if version == shadow else " "
+            print(f"{mark} {version}  {info['published']}  {info['source']}")
+
+
+if __name__ == "__main__":
+    main()
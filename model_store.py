@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from urllib.parse import quote
+
+model_store_root = os.getenv("EMOTION_MODEL_STORE", "./model_store")
+# 只加载模型需要的文件，跳过 README、其它框架的权重等
+model_patterns = ["*.json", "*.txt", "*.model", "*.safetensors", "*.bin"]
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_manifest(directory):
+    """目录下每个文件的相对路径 -> {sha256, size}"""
+    manifest = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, directory).replace(os.sep, "/")
+            manifest[relpath] = {"sha256": file_sha256(path), "size": os.path.getsize(path)}
+    return dict(sorted(manifest.items()))
+
+
+def stat_signature(directory):
+    """目录下文件名、大小和修改时间的哈希：不读文件内容，用来快速判断本地目录是否变化"""
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            relpath = os.path.relpath(path, directory).replace(os.sep, "/")
+            digest.update(f"{relpath}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def manifest_hash(manifest):
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def offline_mode():
+    """EMOTION_OFFLINE 或 HF_HUB_OFFLINE 为 1 时不访问网络，只使用本地仓库"""
+    return any(os.getenv(name, "0").lower() in ("1", "true", "yes") for name in ("EMOTION_OFFLINE", "HF_HUB_OFFLINE"))
+
+
+def _staging_path(path):
+    """临时文件名带随机后缀：多个容器共享仓库时，各自的进程号往往相同（都是 1）"""
+    return f"{path}.tmp{uuid.uuid4().hex}"
+
+
+def _atomic_write(path, content):
+    tmp_path = _staging_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ModelStore:
+    """按内容哈希寻址的本地模型仓库
+
+    - objects/<sha256>：每个文件只存一份，不同模型和版本之间相同的文件共享
+    - snapshots/<清单哈希>/：由 objects 硬链接组成的模型目录，可以直接 from_pretrained
+    - refs/<模型名>@<版本>：指向清单哈希
+    安装时先在临时目录中下载和校验，最后一步才写 ref，多个进程同时安装也不会看到半成品。
+    多个 pod 共享同一个 EMOTION_MODEL_STORE 目录时，只有第一次需要下载。
+    """
+
+    def __init__(self, root=model_store_root):
+        self.root = root
+        for name in ("objects", "snapshots", "refs", "tmp"):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _ref_path(self, model_name, revision):
+        return os.path.join(self.root, "refs", quote(f"{model_name}@{revision or 'main'}", safe=""))
+
+    def _manifest_path(self, digest):
+        return os.path.join(self.root, "snapshots", digest + ".json")
+
+    def resolve(self, model_name, revision=None):
+        """已安装时返回快照目录，否则返回 None"""
+        try:
+            with open(self._ref_path(model_name, revision), "r", encoding="utf-8") as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        path = os.path.join(self.root, "snapshots", digest)
+        return path if os.path.isdir(path) else None
+
+    def install(self, model_name, revision=None, source_dir=None):
+        """把模型装入仓库：source_dir 给出时从本地目录导入，否则从 Hub 下载；返回快照目录"""
+        tmp_dir = tempfile.mkdtemp(prefix=quote(model_name, safe="") + ".", dir=os.path.join(self.root, "tmp"))
+        try:
+            if source_dir is None:
+                if offline_mode():
+                    raise FileNotFoundError(f"离线模式下本地仓库中没有模型 {model_name}@{revision or 'main'}")
+                from huggingface_hub import snapshot_download
+                snapshot_download(model_name, revision=revision, local_dir=tmp_dir, allow_patterns=model_patterns)
+                # 新版 huggingface_hub 会在 local_dir 下写入自己的元数据目录
+                shutil.rmtree(os.path.join(tmp_dir, ".cache"), ignore_errors=True)
+                source_dir = tmp_dir
+            manifest = file_manifest(source_dir)
+            if not manifest:
+                raise FileNotFoundError(f"模型 {model_name} 中没有文件")
+
+            # 先把文件放入 objects（相同内容的文件只保留一份），再用硬链接拼出快照目录
+            for relpath, entry in manifest.items():
+                obj = os.path.join(self.root, "objects", entry["sha256"])
+                if not os.path.exists(obj):
+                    staged = _staging_path(obj)
+                    shutil.copyfile(os.path.join(source_dir, relpath), staged)
+                    os.replace(staged, obj)
+            digest = manifest_hash(manifest)
+            snapshot = os.path.join(self.root, "snapshots", digest)
+            if not os.path.isdir(snapshot):
+                staged = _staging_path(snapshot)
+                for relpath, entry in manifest.items():
+                    target = os.path.join(staged, relpath)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.link(os.path.join(self.root, "objects", entry["sha256"]), target)
+                _atomic_write(self._manifest_path(digest), json.dumps(manifest, indent=2))
+                try:
+                    os.rename(staged, snapshot)
+                except OSError:
+                    # 其它进程已经装好了同一个快照
+                    shutil.rmtree(staged, ignore_errors=True)
+            _atomic_write(self._ref_path(model_name, revision), digest)
+            return snapshot
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def verify(self, snapshot, full=False):
+        """检查快照完整性：默认只比较文件大小，full=True 时重新计算 sha256"""
+        with open(self._manifest_path(os.path.basename(snapshot)), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        problems = []
+        for relpath, entry in manifest.items():
+            path = os.path.join(snapshot, relpath)
+            if not os.path.exists(path):
+                problems.append(f"缺少文件 {relpath}")
+            elif os.path.getsize(path) != entry["size"]:
+                problems.append(f"文件大小不符 {relpath}")
+            elif full and file_sha256(path) != entry["sha256"]:
+                problems.append(f"哈希不符 {relpath}")
+        return problems
+
+    def fetch(self, model_name, revision=None, verify_full=False):
+        """返回可直接加载的本地快照目录；缺失或损坏时（非离线模式）重新安装"""
+        if os.path.isdir(model_name):
+            return self._fetch_local(model_name, revision, verify_full)
+        snapshot = self.resolve(model_name, revision)
+        if snapshot is not None:
+            problems = self.verify(snapshot, full=verify_full)
+            if not problems:
+                return snapshot
+            print(f"本地模型 {model_name} 校验失败: {problems}")
+            self._discard(snapshot)
+        # 兼容旧的 ./cached_models/<模型名> 目录：导入一次，之后从仓库加载
+        legacy_dir = os.path.join("./cached_models", model_name)
+        if os.path.isdir(legacy_dir):
+            return self.install(model_name, revision, source_dir=legacy_dir)
+        return self.install(model_name, revision)
+
+    def _discard(self, snapshot):
+        """删除损坏的快照以及其中损坏的对象，否则重新安装时会被复用"""
+        shutil.rmtree(snapshot, ignore_errors=True)
+        with open(self._manifest_path(os.path.basename(snapshot)), "r", encoding="utf-8") as f:
+            for entry in json.load(f).values():
+                obj = os.path.join(self.root, "objects", entry["sha256"])
+                if os.path.exists(obj) and file_sha256(obj) != entry["sha256"]:
+                    os.remove(obj)
+
+    def _fetch_local(self, directory, revision=None, verify_full=False):
+        """本地目录（如 ./emotion_model）可能被重新训练覆盖：文件名、大小和修改时间都没变时直接用已有快照，
+        否则按内容重新导入（相同文件不会重复存储）"""
+        name = os.path.abspath(directory)
+        signature = stat_signature(directory)
+        signature_path = self._ref_path(name, revision) + ".stat"
+        snapshot = self.resolve(name, revision)
+        if snapshot is not None:
+            try:
+                with open(signature_path, "r", encoding="utf-8") as f:
+                    unchanged = f.read().strip() == signature
+            except OSError:
+                unchanged = False
+            problems = self.verify(snapshot, full=verify_full)
+            if unchanged and not problems:
+                return snapshot
+            if problems:
+                print(f"本地模型 {directory} 校验失败: {problems}")
+                self._discard(snapshot)
+        snapshot = self.install(name, revision, source_dir=directory)
+        _atomic_write(signature_path, signature)
+        return snapshot
+
+    def load(self, model_name, revision=None, num_labels=3, verify_full=False, **model_kwargs):
+        """从本地仓库加载，返回 (tokenizer, model, 各阶段耗时)"""
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        timings = {}
+        start = time.perf_counter()
+        snapshot = self.fetch(model_name, revision, verify_full=verify_full)
+        timings["fetch"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tokenizer = AutoTokenizer.from_pretrained(snapshot, local_files_only=True)
+        timings["tokenizer"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        model = AutoModelForSequenceClassification.from_pretrained(
+            snapshot, num_labels=num_labels, local_files_only=True, **model_kwargs
+        )
+        timings["model"] = time.perf_counter() - start
+
+        print(f"模型 {model_name} 加载自 {snapshot}，耗时: " +
+              "，".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+        return tokenizer, model, timings
+
+    def gc(self):
+        """删除不再被任何 ref 引用的快照和对象，返回删除的文件数"""
+        live_snapshots = set()
+        for name in os.listdir(os.path.join(self.root, "refs")):
+            if name.endswith(".stat"):
+                continue
+            with open(os.path.join(self.root, "refs", name), "r", encoding="utf-8") as f:
+                live_snapshots.add(f.read().strip())
+        live_objects = set()
+        removed = 0
+        snapshots_dir = os.path.join(self.root, "snapshots")
+        for name in os.listdir(snapshots_dir):
+            digest = name[:-len(".json")] if name.endswith(".json") else name
+            if digest in live_snapshots:
+                if name.endswith(".json"):
+                    with open(os.path.join(snapshots_dir, name), "r", encoding="utf-8") as f:
+                        live_objects.update(entry["sha256"] for entry in json.load(f).values())
+                continue
+            path = os.path.join(snapshots_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            removed += 1
+        for name in os.listdir(os.path.join(self.root, "objects")):
+            if name not in live_objects:
+                os.remove(os.path.join(self.root, "objects", name))
+                removed += 1
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按内容哈希寻址的本地模型仓库")
+    parser.add_argument("command", choices=["install", "verify", "gc"])
+    parser.add_argument("models", nargs="*", help="Hub 模型名或本地模型目录")
+    parser.add_argument("--revision", default=None)
+    parser.add_argument("--root", default=model_store_root)
+    args = parser.parse_args()
+
+    store = ModelStore(args.root)
+    if args.command == "gc":
+        print(f"已清理 {store.gc()} 个文件")
+        return
+    for model_name in args.models:
+        if args.command == "install":
+            print(f"{model_name} -> {store.fetch(model_name, args.revision)}")
+        else:
+            # 本地目录以绝对路径登记
+            snapshot = store.resolve(os.path.abspath(model_name) if os.path.isdir(model_name) else model_name, args.revision)
+            problems = ["未安装"] if snapshot is None else store.verify(snapshot, full=True)
+            print(f"{model_name}: {'正常' if not problems else problems}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+
+# 父进程中只加载一次模型，随后 fork 出的 worker 以写时复制方式共享这些内存页
+import torch
+import emotion_server
+
+if emotion_server.model_handle is not None:
+    # 热切换会在各 worker 中各自加载新版本，无法共享父进程的内存页
+    raise SystemExit("预 fork 模式不支持 EMOTION_REGISTRY，请使用固定的模型目录")
+from test_emotion import model, prediction_cache
+
+
+def read_smaps_rollup(pid):
+    """读取 /proc/<pid>/smaps_rollup，返回各项内存（kB）"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def memory_usage(pid):
+    """进程的 RSS / PSS / 独占（USS）/ 共享内存，单位 MB"""
+    values = read_smaps_rollup(pid)
+    return {
+        "rss_mb": values.get("Rss", 0) / 1024,
+        "pss_mb": values.get("Pss", 0) / 1024,
+        "uss_mb": (values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)) / 1024,
+        "shared_mb": (values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0)) / 1024,
+    }
+
+
+def child_pids(pid):
+    pids = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+            pids.extend(int(child) for child in f.read().split())
+    return sorted(pids)
+
+
+def memory_report(parent_pid=None):
+    """父进程和所有 worker 的内存占用；PSS 之和是整组进程实际占用的物理内存"""
+    parent_pid = parent_pid or os.getpid()
+    workers = {}
+    for pid in child_pids(parent_pid):
+        try:
+            workers[pid] = memory_usage(pid)
+        except OSError:
+            # worker 可能刚好退出
+            continue
+    parent = memory_usage(parent_pid)
+    return {
+        "parent": parent,
+        "workers": workers,
+        "total_pss_mb": parent["pss_mb"] + sum(item["pss_mb"] for item in workers.values()),
+        "total_rss_mb": parent["rss_mb"] + sum(item["rss_mb"] for item in workers.values()),
+    }
+
+
+def print_memory_report(report):
+    print("\n=== 内存占用（MB）===")
+    print(f"{'进程':>10} {'RSS':>8} {'PSS':>8} {'独占':>8} {'共享':>8}")
+    rows = [("parent", report["parent"])] + [(str(pid), item) for pid, item in report["workers"].items()]
+    for name, item in rows:
+        print(f"{name:>10} {item['rss_mb']:>8.1f} {item['pss_mb']:>8.1f} {item['uss_mb']:>8.1f} {item['shared_mb']:>8.1f}")
+    print(f"RSS 合计 {report['total_rss_mb']:.1f} MB（各自加载模型时的近似占用），"
+          f"PSS 合计 {report['total_pss_mb']:.1f} MB（实际占用）", flush=True)
+
+
+@emotion_server.app.get("/memory")
+async def memory():
+    """返回本组（父进程 + 所有 worker）的内存占用"""
+    return memory_report(os.getppid())
+
+
+def prepare_model_for_fork():
+    """推理不需要梯度；fork 出的 worker 以写时复制方式共享父进程中的模型权重，推理只读不写，页面不会被复制
+
+    不使用 model.share_memory()：它会把全部权重复制到 /dev/shm，超出 Docker 默认 64 MB 的限制。
+    """
+    torch.set_grad_enabled(False)
+    for param in model.parameters():
+        param.requires_grad_(False)
+    # 冻结父进程中已有的对象：子进程里的垃圾回收不再扫描（写入）它们，避免触发页复制
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock, threads):
+    import uvicorn
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # 重新拉起的 worker 会继承父进程的报告信号处理函数
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    torch.set_num_threads(threads)
+    prediction_cache.after_fork()
+    config = uvicorn.Config(emotion_server.app, log_level="info")
+    # 所有 worker 在同一个监听套接字上 accept，由内核分配连接
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(workers, host, port, threads_per_worker=None, report_after=10):
+    threads = threads_per_worker or max((os.cpu_count() or 1) // workers, 1)
+    prepare_model_for_fork()
+    sock = bind_socket(host, port)
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(sock, threads)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    # kill -USR1 <父进程> 随时打印内存报告；启动后 report_after 秒自动打印一次
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print_memory_report(memory_report()))
+    signal.signal(signal.SIGALRM, lambda signum, frame: print_memory_report(memory_report()))
+    if report_after:
+        signal.alarm(report_after)
+    print(f"已启动 {workers} 个 worker（每个 {threads} 线程），监听 {host}:{port}", flush=True)
+
+    while children:
+        pid, status = os.waitpid(-1, 0)
+        children.discard(pid)
+        if not stopping:
+            print(f"worker {pid} 意外退出（状态 {status}），重新启动", flush=True)
+            spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="父进程加载一次模型，fork 出共享模型内存的多个 worker")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EMOTION_WORKERS", "4")))
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--host", default=os.getenv("EMOTION_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("EMOTION_PORT", "8000")))
+    parser.add_argument("--report-after", type=int, default=10, help="启动后多少秒打印内存报告，0 表示不打印")
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port, args.threads_per_worker, args.report_after)
+
+
+if __name__ == "__main__":
+    main()
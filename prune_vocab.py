@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import shutil
+import string
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, BertTokenizerFast
+
+from score_corpus import iter_chunks
+
+# 即使语料中没有出现也保留的字符：ASCII 字母数字与标点、常用中文标点
+safety_chars = set(string.ascii_letters + string.digits + string.punctuation) | set("，。！？、；：“”‘’（）《》【】…—～·")
+
+
+def scan_corpus(paths, tokenizer, chunk_size=10000, max_length=512):
+    """流式扫描语料，统计实际出现过的 token 编号"""
+    seen = np.zeros(len(tokenizer), dtype=bool)
+    rows = 0
+    for path in paths:
+        for records in iter_chunks(path, chunk_size):
+            texts = [str(record["text"]) for record in records if isinstance(record.get("text"), str)]
+            encoded = tokenizer(texts, truncation=True, max_length=max_length, add_special_tokens=False)
+            for ids in encoded["input_ids"]:
+                seen[ids] = True
+            rows += len(texts)
+    return seen, rows
+
+
+def safety_ids(tokenizer):
+    """特殊 token 以及安全字符集对应的 token（含 ## 子词形式）"""
+    vocab = tokenizer.get_vocab()
+    keep = set(tokenizer.all_special_ids)
+    for char in safety_chars:
+        for token in (char, f"##{char}", char.lower()):
+            if token in vocab:
+                keep.add(vocab[token])
+    return keep
+
+
+def prune_model(model_dir, corpus_paths, output_dir, extra_tokens=()):
+    """只保留语料中出现的 token 和安全集合，重建分词器和嵌入矩阵并保存为更小的模型"""
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    seen, rows = scan_corpus(corpus_paths, tokenizer)
+    keep = set(np.flatnonzero(seen).tolist()) | safety_ids(tokenizer)
+    vocab = tokenizer.get_vocab()
+    keep |= {vocab[token] for token in extra_tokens if token in vocab}
+    # 保持原有的相对顺序，[PAD] 等特殊 token 的位置关系不变
+    keep_ids = sorted(keep)
+
+    id2token = {i: token for token, i in vocab.items()}
+    os.makedirs(output_dir, exist_ok=True)
+    vocab_file = os.path.join(output_dir, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(id2token[i] for i in keep_ids) + "\n")
+    new_tokenizer = BertTokenizerFast(
+        vocab_file=vocab_file,
+        do_lower_case=tokenizer.init_kwargs.get("do_lower_case", True),
+        tokenize_chinese_chars=tokenizer.init_kwargs.get("tokenize_chinese_chars", True),
+        model_max_length=tokenizer.model_max_length
+    )
+
+    old_embeddings = model.get_input_embeddings()
+    new_embeddings = torch.nn.Embedding(len(keep_ids), old_embeddings.embedding_dim,
+                                        padding_idx=new_tokenizer.pad_token_id)
+    new_embeddings.weight.data = old_embeddings.weight.data[torch.tensor(keep_ids)].clone()
+    model.set_input_embeddings(new_embeddings)
+    model.config.vocab_size = len(keep_ids)
+    model.config.pad_token_id = new_tokenizer.pad_token_id
+
+    model.save_pretrained(output_dir)
+    new_tokenizer.save_pretrained(output_dir)
+    np.save(os.path.join(output_dir, "kept_token_ids.npy"), np.asarray(keep_ids, dtype=np.int64))
+    label_map_file = os.path.join(model_dir, "label_map.json")
+    if os.path.exists(label_map_file):
+        shutil.copy(label_map_file, os.path.join(output_dir, "label_map.json"))
+
+    dim = old_embeddings.embedding_dim
+    report = {
+        "corpus_rows": rows,
+        "vocab_before": len(tokenizer),
+        "vocab_after": len(keep_ids),
+        "embedding_mb_before": len(tokenizer) * dim * 4 / 1024 / 1024,
+        "embedding_mb_after": len(keep_ids) * dim * 4 / 1024 / 1024,
+    }
+    with open(os.path.join(output_dir, "prune_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def check_pruned(model_dir, pruned_dir, texts):
+    """检查剪枝后分词结果与原模型一致（映射回原编号后比较），并比较预测概率"""
+    old_tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    new_tokenizer = AutoTokenizer.from_pretrained(pruned_dir)
+    keep_ids = np.load(os.path.join(pruned_dir, "kept_token_ids.npy"))
+    old_ids = old_tokenizer(texts)["input_ids"]
+    new_ids = new_tokenizer(texts)["input_ids"]
+    same = sum(list(keep_ids[ids]) == list(ref) for ids, ref in zip(new_ids, old_ids))
+
+    old_model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    new_model = AutoModelForSequenceClassification.from_pretrained(pruned_dir).eval()
+    with torch.no_grad():
+        old_probs = old_model(**old_tokenizer(texts, return_tensors="pt", padding=True)).logits.softmax(-1)
+        new_probs = new_model(**new_tokenizer(texts, return_tensors="pt", padding=True)).logits.softmax(-1)
+    return {
+        "same_tokenization": same / len(texts) if texts else 1.0,
+        "max_abs_diff": float((old_probs - new_probs).abs().max()) if texts else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按语料剪枝词表，缩小嵌入矩阵")
+    parser.add_argument("--model", default="./emotion_model")
+    parser.add_argument("--corpus", nargs="+", required=True, help="CSV/JSONL 语料文件（text 列）")
+    parser.add_argument("--output", default="./emotion_model_pruned")
+    args = parser.parse_args()
+
+    report = prune_model(args.model, args.corpus, args.output)
+    print("\n=== 词表剪枝 ===")
+    print(f"扫描语料: {report['corpus_rows']} 行")
+    print(f"词表大小: {report['vocab_before']} -> {report['vocab_after']}")
+    print(f"嵌入矩阵: {report['embedding_mb_before']:.1f} MB -> {report['embedding_mb_after']:.1f} MB")
+
+    # 用语料开头的一部分文本做一致性检查
+    sample = [str(record["text"]) for record in next(iter_chunks(args.corpus[0], 200))]
+    check = check_pruned(args.model, args.output, sample)
+    print(f"分词一致比例: {check['same_tokenization']:.1%}，预测概率最大差异: {check['max_abs_diff']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import time
+
+import pandas as pd
+
+from emotion_labels import to_label_id
+
+
+def detect_format(path):
+    return "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+
+
+def iter_chunks(path, chunk_size=10000, skip_rows=0):
+    """以数据块的形式流式读取 CSV（text 列，可选 label 列）或 JSONL，跳过前 skip_rows 行"""
+    if detect_format(path) == "csv":
+        reader = pd.read_csv(
+            path,
+            chunksize=chunk_size,
+            skiprows=lambda i: 0 < i <= skip_rows,
+            dtype={"text": str}
+        )
+        for chunk in reader:
+            yield chunk.to_dict("records")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            # 先去掉空行（如文件末尾多余的换行），skip_rows 按实际记录数计算，断点续跑时仍然对齐
+            records = (line for line in f if line.strip())
+            lines = itertools.islice(records, skip_rows, None)
+            while True:
+                block = list(itertools.islice(lines, chunk_size))
+                if not block:
+                    break
+                yield [json.loads(line) for line in block]
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    """先写临时文件再原子替换，避免崩溃时留下半截检查点"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def format_rows(records, probs, id2label):
+    labels = [id2label[str(i)] for i in range(probs.shape[1])]
+    predicted = probs.argmax(axis=-1)
+    rows = []
+    for record, row, pred in zip(records, probs, predicted):
+        out = {"text": record["text"], "emotion": labels[pred], "confidence": float(row[pred])}
+        out.update({f"prob_{label}": float(p) for label, p in zip(labels, row)})
+        if record.get("label") is not None and not pd.isna(record.get("label")):
+            out["label"] = record["label"]
+        rows.append(out)
+    return rows
+
+
+def serialize_rows(rows, output_format, fieldnames, write_header):
+    """把结果行序列化为 UTF-8 字节"""
+    if output_format == "jsonl":
+        return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    if write_header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def score_corpus(input_path, output_path, checkpoint_path=None, resume=False, chunk_size=10000,
+                 max_tokens=8192, max_length=128):
+    """流式批量打分：逐块读取、按长度分桶批处理、增量写出，并在每块之后保存检查点"""
+    from test_emotion import tokenizer, model, id2label
+    from emotion_scheduler import predict_emotions_bucketed
+
+    checkpoint_path = checkpoint_path or f"{output_path}.ckpt"
+    state = {"rows": 0, "output_bytes": 0, "labeled": 0, "correct": 0, "seconds": 0.0}
+    if resume:
+        saved = load_checkpoint(checkpoint_path)
+        if saved is not None:
+            state.update(saved)
+            print(f"从检查点恢复: 已处理 {state['rows']} 行")
+    else:
+        for path in (output_path, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    output_format = detect_format(output_path)
+    fieldnames = ["text", "emotion", "confidence"] + [f"prob_{id2label[str(i)]}" for i in range(len(id2label))] + ["label"]
+    mode = "r+b" if os.path.exists(output_path) else "wb"
+    with open(output_path, mode) as f:
+        # 丢弃上次崩溃时检查点之后写出的半截数据
+        f.seek(state["output_bytes"])
+        f.truncate()
+        for records in iter_chunks(input_path, chunk_size, skip_rows=state["rows"]):
+            start = time.perf_counter()
+            texts = ["" if pd.isna(record.get("text")) else str(record["text"]) for record in records]
+            probs = predict_emotions_bucketed(texts, tokenizer, model, max_tokens=max_tokens, max_length=max_length)
+            rows = format_rows(records, probs, id2label)
+            f.write(serialize_rows(rows, output_format, fieldnames, write_header=f.tell() == 0))
+
+            predicted = probs.argmax(axis=-1)
+            for row, pred in zip(rows, predicted):
+                if "label" in row:
+                    state["labeled"] += 1
+                    state["correct"] += int(to_label_id(row["label"]) == pred)
+
+            f.flush()
+            os.fsync(f.fileno())
+            elapsed = time.perf_counter() - start
+            state["rows"] += len(records)
+            state["output_bytes"] = f.tell()
+            state["seconds"] += elapsed
+            save_checkpoint(checkpoint_path, state)
+            print(f"已处理 {state['rows']} 行，当前块 {len(records) / elapsed:.1f} 行/秒")
+
+    summary = {
+        "rows": state["rows"],
+        "seconds": state["seconds"],
+        "rows_per_sec": state["rows"] / state["seconds"] if state["seconds"] else 0.0,
+    }
+    if state["labeled"]:
+        summary["labeled"] = state["labeled"]
+        summary["accuracy"] = state["correct"] / state["labeled"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对 CSV/JSONL 语料做流式批量情感打分")
+    parser.add_argument("input", help="输入文件（emotion_data.csv 格式的 CSV，或每行一个 JSON 的 JSONL）")
+    parser.add_argument("output", help="输出文件（.csv 或 .jsonl）")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件，默认为 <output>.ckpt")
+    parser.add_argument("--resume", action="store_true", help="从检查点记录的行号继续")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--max-tokens", type=int, default=8192, help="每个批次的 token 预算")
+    parser.add_argument("--max-length", type=int, default=128)
+    args = parser.parse_args()
+
+    summary = score_corpus(
+        args.input,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        chunk_size=args.chunk_size,
+        max_tokens=args.max_tokens,
+        max_length=args.max_length
+    )
+    print("\n=== 打分完成 ===")
+    print(f"总行数: {summary['rows']}")
+    print(f"耗时: {summary['seconds']:.1f} 秒（{summary['rows_per_sec']:.1f} 行/秒）")
+    if "accuracy" in summary:
+        print(f"准确率: {summary['accuracy']:.4f}（有标签 {summary['labeled']} 行）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,93 @@
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
+import numpy as np
 import json
+import os
 
 # 1. 加载保存的模型和分词器
 model_path = "./emotion_model"
-try:
-    # 尝试直接加载本地模型
+# 模型变体：fp32（默认）、int8（Emo4.py 保存的动态量化模型）或 bundle（model_bundle.py 打包的单文件模型）
+model_variant = os.getenv("EMOTION_MODEL_VARIANT", "fp32")
+id2label = None
+if model_variant == "bundle":
+    # 权重、分词器和标签映射都来自同一个文件，权重以内存映射方式加载；加载失败直接报错，不回退
+    from model_bundle import load_bundle
+    model_path = os.getenv("EMOTION_MODEL_BUNDLE", "./emotion_model.bundle")
+    tokenizer, model, id2label, bundle_manifest = load_bundle(model_path)
+elif model_variant == "int8":
+    # 明确要求 int8 时加载失败直接报错：回退到预训练模型会以 int8 的名义（包括缓存键）提供未微调的 fp32 模型
+    from emotion_quantize import int8_model_path, load_quantized
     tokenizer = AutoTokenizer.from_pretrained(model_path)
-    model = AutoModelForSequenceClassification.from_pretrained(model_path)
-except Exception as e:
-    print(f"加载本地模型失败: {e}")
-    print("尝试使用原始预训练模型...")
-    # 如果失败，使用原始的预训练模型
-    model_name = "hfl/chinese-bert-wwm-ext"
-    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-    model = AutoModelForSequenceClassification.from_pretrained(model_path, trust_remote_code=True)
+    model = load_quantized(int8_model_path(model_path))
+else:
+    try:
+        # 尝试直接加载本地模型
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    except Exception as e:
+        print(f"加载本地模型失败: {e}")
+        print("尝试使用原始预训练模型...")
+        # 如果失败，使用原始的预训练模型
+        model_name = "hfl/chinese-bert-wwm-ext"
+        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+        model = AutoModelForSequenceClassification.from_pretrained(model_path, trust_remote_code=True)
+model.eval()
+
+# 加载标签映射（模型包自带标签映射）
+if id2label is None:
+    try:
+        with open(f"{model_path}/label_map.json", "r", encoding="utf-8") as f:
+            id2label = json.load(f)
+    except:
+        # 使用默认标签映射
+        id2label = {"0": "快乐", "1": "愤怒", "2": "悲伤"}
 
-# 加载标签映射
-try:
-    with open(f"{model_path}/label_map.json", "r", encoding="utf-8") as f:
-        id2label = json.load(f)
-except:
-    # 使用默认标签映射
-    id2label = {"0": "快乐", "1": "愤怒", "2": "悲伤"}
+# 预测结果缓存：EMOTION_CACHE_SIZE=0 关闭，EMOTION_CACHE_PATH 指定磁盘缓存文件（重启后仍可命中）
+from emotion_cache import PredictionCache, model_version
+prediction_cache = PredictionCache(
+    bundle_manifest["tensors_sha256"][:16] if model_variant == "bundle" else model_version(model_path, model_variant),
+    maxsize=int(os.getenv("EMOTION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("EMOTION_CACHE_TTL")) if os.getenv("EMOTION_CACHE_TTL") else None,
+    disk_path=os.getenv("EMOTION_CACHE_PATH")
+)
 
 # 2. 定义预测函数
-def predict_emotion(text):
-    # 对输入文本进行编码
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=128)
-    
-    # 获取预测结果
-    with torch.no_grad():
-        outputs = model(**inputs)
-        predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        predicted_label = torch.argmax(predictions, dim=-1).item()
-    
-    # 获取所有情感的概率
-    probs = {id2label[str(i)]: predictions[0][i].item() for i in range(len(id2label))}
-    
+def predict_emotions(texts, batch_size=32, max_length=128):
+    """批量预测情感，返回形状为 (len(texts), 标签数) 的概率数组"""
+    texts = list(texts)
+    all_probs = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        # 整批编码，只填充到本批次中最长的文本
+        inputs = tokenizer(batch, return_tensors="pt", padding="longest", truncation=True, max_length=max_length)
+
+        # 每个批次只做一次前向计算
+        with torch.no_grad():
+            logits = model(**inputs).logits
+            all_probs.append(torch.nn.functional.softmax(logits, dim=-1).numpy())
+
+    if not all_probs:
+        return np.zeros((0, len(id2label)), dtype=np.float32)
+    return np.concatenate(all_probs, axis=0)
+
+def predict_emotions_cached(texts, batch_size=32):
+    """带缓存的批量预测，只有未命中的文本才会进入模型"""
+    return prediction_cache.predict(texts, lambda misses: predict_emotions(misses, batch_size=batch_size))
+
+def format_prediction(probs):
+    """将单条文本的概率向量转换为结果字典"""
+    probs = np.asarray(probs).tolist()
+    predicted_label = int(np.argmax(probs))
     return {
         "emotion": id2label[str(predicted_label)],
-        "confidence": predictions[0][predicted_label].item(),
-        "probabilities": probs
+        "confidence": probs[predicted_label],
+        "probabilities": {id2label[str(i)]: p for i, p in enumerate(probs)}
     }
 
+def predict_emotion(text):
+    """预测单条文本的情感（predict_emotions 的简单封装，结果经过缓存）"""
+    return format_prediction(predict_emotions_cached([text])[0])
+
 # 3. 测试模型
 test_texts = [
     "今天真是太开心了，一切都很顺利！",
@@ -54,16 +98,18 @@ test_texts = [
 ]
 
 # 4. 进行预测并输出结果
-print("\n=== 情感预测结果 ===")
-for text in test_texts:
-    try:
-        result = predict_emotion(text)
-        print(f"\n文本: {text}")
-        print(f"预测情感: {result['emotion']}")
-        print(f"置信度: {result['confidence']:.2f}")
-        print("各情感概率分布:")
-        for emotion, prob in result['probabilities'].items():
-            print(f"  {emotion}: {prob:.2f}")
-    except Exception as e:
-        print(f"\n处理文本时出错: {text}")
-        print(f"错误信息: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    print("\n=== 情感预测结果 ===")
+    for text in test_texts:
+        try:
+            result = predict_emotion(text)
+            print(f"\n文本: {text}")
+            print(f"预测情感: {result['emotion']}")
+            print(f"置信度: {result['confidence']:.2f}")
+            print("各情感概率分布:")
+            for emotion, prob in result['probabilities'].items():
+                print(f"  {emotion}: {prob:.2f}")
+        except Exception as e:
+            print(f"\n处理文本时出错: {text}")
+            print(f"错误信息: {e}")
+    print(f"\n缓存统计: {prediction_cache.stats()}")
@@ -0,0 +1,51 @@
+import numpy as np
+
+from emotion_cache import PredictionCache
+
+
+def make_predict(calls):
+    def predict_fn(texts):
+        calls.append(list(texts))
+        return np.array([[len(text), 0.0, 1.0] for text in texts], dtype=np.float32)
+    return predict_fn
+
+
+def test_hits_skip_the_model_and_misses_are_deduplicated():
+    calls = []
+    cache = PredictionCache("v1")
+    probs = cache.predict(["你好", "你好 ", "再见"], make_predict(calls))
+    # 规范化后相同的文本只计算一次
+    assert calls == [["你好", "再见"]]
+    assert probs.shape == (3, 3)
+    np.testing.assert_array_equal(probs[0], probs[1])
+    cache.predict(["再见", "你好"], make_predict(calls))
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_version_change_invalidates_keys():
+    assert PredictionCache("v1").key("你好") != PredictionCache("v2").key("你好")
+
+
+def test_lru_evicts_oldest_entry():
+    cache = PredictionCache("v1", maxsize=2)
+    cache.put_many(["a", "b", "c"], np.ones((3, 3)))
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("emotion_cache.time.time", lambda: now[0])
+    cache = PredictionCache("v1", ttl=10)
+    cache.put_many(["a"], np.ones((1, 3)))
+    now[0] += 11
+    assert cache.get("a") is None
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "cache" / "predictions.sqlite")
+    PredictionCache("v1", disk_path=path).put_many(["你好"], np.array([[0.1, 0.2, 0.7]]))
+    cache = PredictionCache("v1", disk_path=path)
+    np.testing.assert_allclose(cache.get("你好"), [0.1, 0.2, 0.7], rtol=1e-6)
+    assert cache.stats()["disk_hits"] == 1
@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from emotion_scheduler import naive_batches, padding_waste, plan_batches
+
+
+def test_batches_cover_every_index_once_within_budget():
+    lengths = [5, 120, 7, 64, 3, 33, 128, 9, 17, 40]
+    batches = plan_batches(lengths, max_tokens=256, max_batch_size=4)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 4
+        assert max(lengths[i] for i in batch) * len(batch) <= 256
+
+
+def test_single_overlong_text_gets_its_own_batch():
+    assert plan_batches([10, 500, 10], max_tokens=100) == [[0, 2], [1]]
+
+
+def test_length_sorting_reduces_padding():
+    lengths = [4, 120, 5, 118, 6, 121, 3, 119]
+    assert padding_waste(lengths, plan_batches(lengths, max_tokens=256)) < padding_waste(lengths, naive_batches(len(lengths), 2))
+
+
+def test_empty_input():
+    assert plan_batches([]) == []
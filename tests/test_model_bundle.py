@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("safetensors")
+pytest.importorskip("accelerate")
+
+from model_bundle import load_bundle, verify_bundle, write_bundle
+
+
+@pytest.fixture
+def cased_model_dir(tmp_path):
+    """区分大小写词表的小模型（模拟 bert-base-multilingual-cased）"""
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "Hello", "hello", "World", "world", "你", "好", "！"]
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab) + "\n", encoding="utf-8")
+    model_dir = tmp_path / "model"
+    tokenizer = transformers.BertTokenizerFast(vocab_file=str(vocab_file), do_lower_case=False)
+    tokenizer.save_pretrained(model_dir)
+    config = transformers.BertConfig(vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1,
+                                     num_attention_heads=2, intermediate_size=32, num_labels=3)
+    transformers.BertForSequenceClassification(config).save_pretrained(model_dir)
+    (model_dir / "label_map.json").write_text(json.dumps({"0": "快乐", "1": "愤怒", "2": "悲伤"}), encoding="utf-8")
+    return model_dir
+
+
+def test_bundle_round_trip_matches_model_dir(cased_model_dir, tmp_path):
+    bundle = str(tmp_path / "model.bundle")
+    write_bundle(str(cased_model_dir), bundle)
+    assert verify_bundle(bundle) == []
+
+    tokenizer, model, id2label, _ = load_bundle(bundle, verify=True)
+    reference_tokenizer = transformers.AutoTokenizer.from_pretrained(cased_model_dir)
+    reference_model = transformers.AutoModelForSequenceClassification.from_pretrained(cased_model_dir).eval()
+
+    texts = ["Hello World", "hello world！", "你好"]
+    expected = reference_tokenizer(texts)["input_ids"]
+    assert tokenizer(texts)["input_ids"] == expected
+    assert expected[0] != expected[1]
+    assert id2label == {"0": "快乐", "1": "愤怒", "2": "悲伤"}
+
+    inputs = reference_tokenizer(texts, return_tensors="pt", padding=True)
+    with torch.no_grad():
+        assert torch.allclose(model(**inputs).logits, reference_model(**inputs).logits)
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from model_store import ModelStore, file_manifest
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    directory = tmp_path / "model"
+    directory.mkdir()
+    (directory / "config.json").write_text('{"num_labels": 3}', encoding="utf-8")
+    (directory / "vocab.txt").write_text("[PAD]\n[UNK]\n你\n好\n", encoding="utf-8")
+    return directory
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # 测试中不允许访问网络
+    monkeypatch.setenv("EMOTION_OFFLINE", "1")
+    return ModelStore(str(tmp_path / "store"))
+
+
+def count_installs(store, monkeypatch):
+    calls = []
+    install = store.install
+    monkeypatch.setattr(store, "install", lambda *args, **kwargs: calls.append(args) or install(*args, **kwargs))
+    return calls
+
+
+def test_install_creates_verified_snapshot(store, model_dir):
+    snapshot = store.fetch(str(model_dir))
+    assert file_manifest(snapshot) == file_manifest(str(model_dir))
+    assert store.verify(snapshot, full=True) == []
+    assert os.listdir(os.path.join(store.root, "tmp")) == []
+
+
+def test_unchanged_local_dir_is_not_reinstalled(store, model_dir, monkeypatch):
+    first = store.fetch(str(model_dir))
+    calls = count_installs(store, monkeypatch)
+    assert store.fetch(str(model_dir)) == first
+    assert calls == []
+
+
+def test_changed_and_deleted_files_produce_new_snapshot(store, model_dir):
+    first = store.fetch(str(model_dir))
+    (model_dir / "config.json").write_text('{"num_labels": 4}', encoding="utf-8")
+    changed = store.fetch(str(model_dir))
+    assert changed != first
+    assert (open(os.path.join(changed, "config.json"), encoding="utf-8").read()) == '{"num_labels": 4}'
+
+    (model_dir / "vocab.txt").unlink()
+    deleted = store.fetch(str(model_dir))
+    assert sorted(os.listdir(deleted)) == ["config.json"]
+    # 旧快照不再被引用，gc 后只剩当前快照
+    assert store.gc() > 0
+    assert store.verify(deleted, full=True) == []
+    assert not os.path.exists(first)
+
+
+def test_identical_files_are_stored_once(store, model_dir, tmp_path):
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "vocab.txt").write_bytes((model_dir / "vocab.txt").read_bytes())
+    store.fetch(str(model_dir))
+    store.fetch(str(other))
+    assert len(os.listdir(os.path.join(store.root, "objects"))) == 2
+
+
+def test_corrupted_snapshot_is_repaired(store, model_dir):
+    snapshot = store.fetch(str(model_dir))
+    with open(os.path.join(snapshot, "vocab.txt"), "a", encoding="utf-8") as f:
+        f.write("坏\n")
+    assert store.verify(snapshot) != []
+    repaired = store.fetch(str(model_dir))
+    assert store.verify(repaired, full=True) == []
+
+
+def test_offline_mode_never_downloads(store):
+    with pytest.raises(FileNotFoundError):
+        store.fetch("someone/missing-model")
@@ -0,0 +1,9 @@
+from score_corpus import iter_chunks
+
+
+def test_jsonl_skips_blank_lines(tmp_path):
+    path = tmp_path / "corpus.jsonl"
+    path.write_text('{"text": "a"}\n\n{"text": "b"}\n{"text": "c"}\n\n', encoding="utf-8")
+    assert list(iter_chunks(str(path), chunk_size=2)) == [[{"text": "a"}, {"text": "b"}], [{"text": "c"}]]
+    # 断点续跑按记录数跳过，空行不计入
+    assert list(iter_chunks(str(path), chunk_size=2, skip_rows=2)) == [[{"text": "c"}]]
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+pytest.importorskip("huggingface_hub")
+pytest.importorskip("dotenv")
+
+from upload_model import LocalDirTarget, delta_upload, manifest_path_for
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    directory = tmp_path / "model"
+    (directory / "sub").mkdir(parents=True)
+    (directory / "config.json").write_text('{"num_labels": 3}', encoding="utf-8")
+    (directory / "model.safetensors").write_bytes(b"\x00" * 1024)
+    (directory / "sub" / "vocab.txt").write_text("[PAD]\n你\n好\n", encoding="utf-8")
+    return directory
+
+
+@pytest.fixture
+def target(tmp_path):
+    return LocalDirTarget(str(tmp_path / "remote"))
+
+
+def count_applies(target, monkeypatch):
+    calls = []
+    apply = target.apply
+    monkeypatch.setattr(target, "apply", lambda *args: calls.append(args) or apply(*args))
+    return calls
+
+
+def read(root, relpath):
+    with open(os.path.join(root, relpath), "rb") as f:
+        return f.read()
+
+
+def test_first_upload_copies_all_files(model_dir, target):
+    report = delta_upload(str(model_dir), target)
+    assert sorted(report["uploaded"]) == ["config.json", "model.safetensors", "sub/vocab.txt"]
+    assert report["deleted"] == []
+    for relpath in report["uploaded"]:
+        assert read(target.root, relpath) == read(str(model_dir), relpath)
+    # 清单放在模型目录旁边，不会被当作模型文件上传
+    assert os.path.exists(manifest_path_for(str(model_dir)))
+
+
+def test_reupload_without_changes_is_noop(model_dir, target, monkeypatch):
+    delta_upload(str(model_dir), target)
+    calls = count_applies(target, monkeypatch)
+    report = delta_upload(str(model_dir), target)
+    assert report["uploaded"] == [] and report["deleted"] == []
+    assert report["unchanged"] == 3
+    assert calls == []
+
+
+def test_changed_file_is_the_only_upload(model_dir, target):
+    delta_upload(str(model_dir), target)
+    (model_dir / "config.json").write_text('{"num_labels": 4}', encoding="utf-8")
+    report = delta_upload(str(model_dir), target)
+    assert report["uploaded"] == ["config.json"]
+    assert report["unchanged"] == 2
+    assert read(target.root, "config.json") == b'{"num_labels": 4}'
+
+
+def test_deleted_file_is_removed_from_target(model_dir, target):
+    delta_upload(str(model_dir), target)
+    os.remove(model_dir / "sub" / "vocab.txt")
+    report = delta_upload(str(model_dir), target)
+    assert report["uploaded"] == []
+    assert report["deleted"] == ["sub/vocab.txt"]
+    assert not os.path.exists(os.path.join(target.root, "sub", "vocab.txt"))
+
+
+def test_force_uploads_everything_and_still_deletes(model_dir, target):
+    delta_upload(str(model_dir), target)
+    os.remove(model_dir / "sub" / "vocab.txt")
+    report = delta_upload(str(model_dir), target, force=True)
+    assert sorted(report["uploaded"]) == ["config.json", "model.safetensors"]
+    assert report["deleted"] == ["sub/vocab.txt"]
+    assert not os.path.exists(os.path.join(target.root, "sub", "vocab.txt"))
+
+
+def test_manifest_is_tracked_per_target(model_dir, target, tmp_path):
+    delta_upload(str(model_dir), target)
+    # 新目标没有上传记录，需要全部上传
+    report = delta_upload(str(model_dir), LocalDirTarget(str(tmp_path / "mirror")))
+    assert len(report["uploaded"]) == 3
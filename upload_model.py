@@ -1,54 +1,154 @@
-from huggingface_hub import HfApi, create_repo, login
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from huggingface_hub import HfApi, CommitOperationAdd, CommitOperationDelete, create_repo, login
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import json
 import os
+import shutil
 from dotenv import load_dotenv
 
+from model_store import file_manifest
+
 # 加载环境变量
 load_dotenv()
 
-def upload_model_to_hf():
-    # 使用 token 登录
-    token = os.getenv('HUGGINGFACE_TOKEN')
-    login(token)
-    
+
+class HubTarget:
+    """上传到 Hugging Face Hub：所有变更放在一次提交中，文件并行上传"""
+
+    def __init__(self, repo_id, token=None, num_threads=8):
+        self.repo_id = repo_id
+        self.token = token
+        self.num_threads = num_threads
+        self.id = f"hub:{repo_id}"
+
+    def apply(self, model_dir, changed, deleted):
+        api = HfApi()
+        print(f"\n创建仓库: {self.repo_id}")
+        # 创建仓库（如果不存在）
+        create_repo(self.repo_id, exist_ok=True, token=self.token)
+        operations = [CommitOperationAdd(path_in_repo=relpath, path_or_fileobj=os.path.join(model_dir, relpath))
+                      for relpath in changed]
+        operations += [CommitOperationDelete(path_in_repo=relpath) for relpath in deleted]
+        api.create_commit(
+            repo_id=self.repo_id,
+            repo_type="model",
+            operations=operations,
+            commit_message=f"Update {len(changed)} file(s), delete {len(deleted)} file(s)",
+            num_threads=self.num_threads,
+            token=self.token
+        )
+
+
+class LocalDirTarget:
+    """上传到本地目录或挂载的文件服务器目录（测试时代替 Hub）"""
+
+    def __init__(self, root, num_threads=8):
+        self.root = root
+        self.num_threads = num_threads
+        self.id = f"dir:{os.path.abspath(root)}"
+
+    def _copy(self, model_dir, relpath):
+        target = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # 先写临时文件再改名，读取方不会看到写了一半的文件
+        tmp_path = f"{target}.tmp{os.getpid()}"
+        shutil.copyfile(os.path.join(model_dir, relpath), tmp_path)
+        os.replace(tmp_path, target)
+
+    def apply(self, model_dir, changed, deleted):
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            list(executor.map(lambda relpath: self._copy(model_dir, relpath), changed))
+        for relpath in deleted:
+            path = os.path.join(self.root, relpath)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def manifest_path_for(model_dir):
+    """哈希清单保存在模型目录旁边（./emotion_model.manifest.json），不会被当作模型文件上传"""
+    return os.path.normpath(model_dir) + ".manifest.json"
+
+
+def delta_upload(model_dir, target, manifest_path=None, force=False):
+    """只上传相对上次上传到同一目标有变化的文件，并删除目标中已不存在的文件
+
+    清单按目标分别记录上次成功上传时各文件的 sha256；force=True 时全部重新上传，但仍按清单删除本地已不存在的文件。
+    """
+    manifest_path = manifest_path or manifest_path_for(model_dir)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifests = json.load(f)
+    except OSError:
+        manifests = {}
+    previous = manifests.get(target.id, {})
+    current = file_manifest(model_dir)
+
+    changed = [relpath for relpath, entry in current.items()
+               if force or previous.get(relpath, {}).get("sha256") != entry["sha256"]]
+    deleted = [relpath for relpath in previous if relpath not in current]
+    report = {
+        "uploaded": changed,
+        "deleted": deleted,
+        "unchanged": len(current) - len(changed),
+        "upload_mb": sum(current[relpath]["size"] for relpath in changed) / 1024 / 1024,
+        "total_mb": sum(entry["size"] for entry in current.values()) / 1024 / 1024,
+    }
+    if changed or deleted:
+        target.apply(model_dir, changed, deleted)
+    # 只有上传成功后才更新清单，失败时下次会重新上传这些文件
+    manifests[target.id] = current
+    tmp_path = f"{manifest_path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifests, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return report
+
+
+def print_report(report):
+    print(f"上传 {len(report['uploaded'])} 个文件（{report['upload_mb']:.1f} / {report['total_mb']:.1f} MB），"
+          f"删除 {len(report['deleted'])} 个，未变化 {report['unchanged']} 个")
+    for relpath in report["uploaded"]:
+        print(f"+ {relpath}")
+    for relpath in report["deleted"]:
+        print(f"- {relpath}")
+
+
+def upload_model_to_hf(target_dir=None, force=False):
     # 配置信息
     local_model_path = "./emotion_model"  # 本地模型路径（确保这个目录存在）
     repo_name = "emotion-classifier"  # 新的仓库名
     username = "WJL110"  # 您的用户名
-    
+
     # 创建完整的仓库ID
     repo_id = f"{username}/{repo_name}"
-    
+
     try:
         # 检查本地模型路径是否存在
         if not os.path.exists(local_model_path):
             raise ValueError(f"模型路径 {local_model_path} 不存在！请先确保模型已经训练并保存。")
-            
+
         print(f"正在检查模型路径: {local_model_path}")
         print(f"文件列表:")
         for file in os.listdir(local_model_path):
             print(f"- {file}")
-            
-        # 创建 API 实例
-        api = HfApi()
-        
-        print(f"\n创建仓库: {repo_id}")
-        # 创建仓库（如果不存在）
-        create_repo(repo_id, exist_ok=True, token=token)
-        
-        print("\n开始上传模型...")
-        # 上传整个模型文件夹
-        api.upload_folder(
-            folder_path=local_model_path,
-            repo_id=repo_id,
-            repo_type="model",
-            token=token
-        )
-        
+
+        if target_dir:
+            # 上传到本地目录（测试用），不需要 token
+            target = LocalDirTarget(target_dir)
+        else:
+            # 使用 token 登录
+            token = os.getenv('HUGGINGFACE_TOKEN')
+            login(token)
+            target = HubTarget(repo_id, token=token)
+
+        print("\n开始上传模型（只上传有变化的文件）...")
+        report = delta_upload(local_model_path, target, force=force)
+        print_report(report)
+
         print(f"\n模型上传成功！")
-        print(f"您可以在这里查看您的模型: https://huggingface.co/{repo_id}")
-        
+        if not target_dir:
+            print(f"您可以在这里查看您的模型: https://huggingface.co/{repo_id}")
+
     except Exception as e:
         print(f"上传过程中出错: {e}")
         print("\n请检查:")
@@ -57,4 +157,8 @@ def upload_model_to_hf():
         print("3. 网络连接是否正常")
 
 if __name__ == "__main__":
-    upload_model_to_hf() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="增量上传模型：只上传哈希发生变化的文件")
+    parser.add_argument("--target-dir", default=None, help="上传到本地目录而不是 Hugging Face Hub")
+    parser.add_argument("--full", action="store_true", help="重新上传全部文件（仍会删除目标中本地已不存在的文件）")
+    args = parser.parse_args()
+    upload_model_to_hf(args.target_dir, args.full)